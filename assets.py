@@ -0,0 +1,313 @@
+"""
+Theme asset caches shared by every card render
+Backgrounds, fonts and pre-rendered static layers are built once instead of
+once per card, and backgrounds and layers are kept as raw pixel files that
+every worker process maps instead of holding its own copy
+"""
+
+import glob
+import hashlib
+import mmap
+import os
+import shutil
+import threading
+from typing import Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+import PIL
+from PIL import Image, ImageFont
+
+import config
+
+# Raw layout each storable mode is kept in, RGB is padded to RGBX as Pillow holds it in memory
+RAW_MODES = {'RGB': 'RGBX', 'RGBA': 'RGBA', 'L': 'L'}
+RAW_PIXEL_BYTES = {'RGBX': 4, 'RGBA': 4, 'L': 1}
+
+
+def private_copy(image: Image.Image, box: Optional[Tuple[int, int, int, int]] = None) -> Image.Image:
+    """Writable copy of a cached image or of a region of it, mapped RGBX comes back as RGB"""
+    if image.mode == 'RGBX':
+        return (image.crop(box) if box else image).convert('RGB')
+    return image.crop(box) if box else image.copy()
+
+
+def _code_version() -> str:
+    """Fingerprint of the code that draws stored images, so a deploy never maps an older build's files"""
+    digest = hashlib.sha1(PIL.__version__.encode())
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ('assets.py', 'layout.py'):
+        try:
+            with open(os.path.join(here, name), 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+    return digest.hexdigest()[:12]
+
+
+class RawImageStore:
+    """Images stored as raw pixel files and memory-mapped read-only with Image.frombuffer
+
+    Every process that maps a file shares one copy of its pixels through the
+    page cache, so render workers and shard processes cost no extra image
+    memory and never decode a background themselves once the file exists
+    """
+
+    def __init__(self, directory: str):
+        self.root = directory
+        self.directory = os.path.join(directory, _code_version()) if directory else ''
+
+    def get(self, key: Hashable, stamp: Tuple, build: Callable[[], Optional[Image.Image]]) -> Optional[Image.Image]:
+        """Map the stored image for key at this source stamp, building and storing it first if needed"""
+        if not self.directory:
+            return build()
+        name = self.name(key)
+        prefix = os.path.join(self.directory, f"{name}-{hashlib.sha1(repr(stamp).encode()).hexdigest()[:12]}-")
+        for path in glob.glob(glob.escape(prefix) + '*.raw'):
+            image = self._map(path)
+            if image is not None:
+                return image
+
+        image = build()
+        if image is None or image.mode not in RAW_MODES:
+            return image
+        try:
+            path = self._write(prefix, image)
+        except OSError as e:
+            print(f"❌ Failed to store {key} as raw pixels, keeping it in memory: {e}")
+            return image
+        # Older stamps of the same image, processes still mapping them keep their pages
+        for stale in glob.glob(glob.escape(os.path.join(self.directory, name)) + '-*.raw'):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+        return self._map(path) or image
+
+    @staticmethod
+    def name(key: Hashable) -> str:
+        """File name prefix shared by every stored stamp of key"""
+        return hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+
+    def sizes(self) -> Dict[str, int]:
+        """Bytes stored under each file name prefix"""
+        sizes: Dict[str, int] = {}
+        try:
+            entries = list(os.scandir(self.directory)) if self.directory else []
+        except OSError:
+            entries = []
+        for entry in entries:
+            if entry.name.endswith('.raw'):
+                name = entry.name.split('-', 1)[0]
+                try:
+                    sizes[name] = sizes.get(name, 0) + entry.stat().st_size
+                except OSError:
+                    pass
+        return sizes
+
+    def discard(self, key: Hashable):
+        """Delete every stored stamp of key, processes still mapping them keep their pages"""
+        if not self.directory:
+            return
+        for path in glob.glob(glob.escape(os.path.join(self.directory, self.name(key))) + '-*.raw'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def prune(self):
+        """Delete files stored by other code versions"""
+        if not self.directory or not os.path.isdir(self.root):
+            return
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if path != self.directory and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _write(self, prefix: str, image: Image.Image) -> str:
+        rawmode = RAW_MODES[image.mode]
+        path = f"{prefix}{rawmode}-{image.width}x{image.height}.raw"
+        os.makedirs(self.directory, exist_ok=True)
+        # Write beside the target and rename, so a concurrent reader never maps a partial file
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(image.convert(rawmode).tobytes() if image.mode != rawmode else image.tobytes())
+        os.replace(temp, path)
+        return path
+
+    @staticmethod
+    def _map(path: str) -> Optional[Image.Image]:
+        rawmode, dimensions = os.path.basename(path)[:-len('.raw')].split('-')[2:]
+        size = tuple(int(v) for v in dimensions.split('x'))
+        try:
+            with open(path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(data) != size[0] * size[1] * RAW_PIXEL_BYTES[rawmode]:
+            data.close()
+            return None
+        # Mapped images are read-only, Pillow copies them before any in-place edit
+        return Image.frombuffer(rawmode, size, data, 'raw', rawmode, 0, 1)
+
+
+class BackgroundCache:
+    """Decoded, pre-resized theme backgrounds keyed by (path, mode, size)"""
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str, Tuple[int, int]], Tuple[int, Image.Image]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, mode: str = 'RGB',
+            size: Optional[Tuple[int, int]] = None) -> Optional[Image.Image]:
+        """Return a private copy of the background, or None if it can't be loaded"""
+        size = size or (config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        key = (path, mode, size)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != mtime:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != mtime:
+                    image = raw_store.get(self.stored_key(path, mode, size), (mtime,),
+                                          lambda: self._load(path, mode, size))
+                    if image is None:
+                        self._entries.pop(key, None)
+                        return None
+                    entry = (mtime, image)
+                    self._entries[key] = entry
+
+        return private_copy(entry[1])
+
+    def warm(self, path: str, mode: str = 'RGB', size: Optional[Tuple[int, int]] = None) -> bool:
+        """Load a background ahead of the first render"""
+        return self.get(path, mode, size) is not None
+
+    def discard(self, path: str):
+        """Drop every cached mode and size of one background"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop every cached background"""
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def stored_key(path: str, mode: str, size: Tuple[int, int]) -> Tuple:
+        """Key of the background's raw pixel file in raw_store"""
+        return 'background', path, mode, size
+
+    @staticmethod
+    def _load(path: str, mode: str, size: Tuple[int, int]) -> Optional[Image.Image]:
+        """Decode, convert and resize a background image"""
+        try:
+            with Image.open(path) as img:
+                img = img.convert(mode)
+                img = img.resize(size, Image.Resampling.LANCZOS)
+        except (OSError, ValueError) as e:
+            print(f"❌ Failed to load background {path}: {e}")
+            return None
+        return img
+
+
+class FontRegistry:
+    """Process-wide TrueType faces keyed by (path, size), reloaded when the font file changes"""
+
+    def __init__(self):
+        self._fonts: Dict[Tuple[str, int], Tuple[Optional[int], ImageFont.ImageFont]] = {}
+        self._lock = threading.Lock()
+        # (path, size) -> error message for faces that fell back to the default font
+        self.failures: Dict[Tuple[str, int], str] = {}
+
+    def get(self, path: str, size: int):
+        """Return the loaded face, falling back to Pillow's default font on failure"""
+        key = (path, size)
+        mtime = _mtime(path)
+        entry = self._fonts.get(key)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        with self._lock:
+            entry = self._fonts.get(key)
+            if entry is None or entry[0] != mtime:
+                try:
+                    font = ImageFont.truetype(path, size)
+                    self.failures.pop(key, None)
+                except OSError as e:
+                    self.failures[key] = str(e)
+                    print(f"❌ Failed to load font {path} ({size}px), using default font: {e}")
+                    font = ImageFont.load_default()
+                entry = self._fonts[key] = (mtime, font)
+        return entry[1]
+
+    def theme_fonts(self, fonts: Dict[str, Tuple[str, int]]) -> Dict[str, ImageFont.ImageFont]:
+        """Resolve a theme's font table to loaded faces"""
+        return {role: self.get(path, size) for role, (path, size) in fonts.items()}
+
+    def warm(self, fonts: Dict[str, Tuple[str, int]]) -> bool:
+        """Load a theme's fonts ahead of the first render, returns False if any failed"""
+        self.theme_fonts(fonts)
+        return not any(spec in self.failures for spec in fonts.values())
+
+    def clear(self):
+        """Drop every loaded face and recorded failure"""
+        with self._lock:
+            self._fonts.clear()
+            self.failures.clear()
+
+
+class LayerCache:
+    """Pre-rendered static layers, rebuilt when any of their source files change"""
+
+    def __init__(self):
+        self._layers: Dict[Hashable, Tuple[Tuple[Optional[int], ...], Image.Image]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, sources: Sequence[str], build: Callable[[], Image.Image]) -> Image.Image:
+        """Return a private copy of the layer, building it on first use"""
+        return private_copy(self.get_shared(key, sources, build))
+
+    def get_shared(self, key: Hashable, sources: Sequence[str], build: Callable[[], Image.Image]) -> Image.Image:
+        """Return the cached layer itself, mapped read-only where possible, RGB layers come back as RGBX"""
+        stamp = source_stamp(sources)
+        entry = self._layers.get(key)
+        if entry is None or entry[0] != stamp:
+            with self._lock:
+                entry = self._layers.get(key)
+                if entry is None or entry[0] != stamp:
+                    entry = (stamp, raw_store.get(key, stamp, build))
+                    self._layers[key] = entry
+        return entry[1]
+
+    def discard(self, key: Hashable):
+        """Drop one cached layer"""
+        with self._lock:
+            self._layers.pop(key, None)
+
+    def clear(self):
+        """Drop every cached layer"""
+        with self._lock:
+            self._layers.clear()
+
+
+def source_stamp(paths: Sequence[str]) -> Tuple[Optional[int], ...]:
+    """Modification times of a cached item's source files, None for missing files"""
+    return tuple(_mtime(path) for path in paths)
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+raw_store = RawImageStore(config.ASSET_CACHE_DIR)
+background_cache = BackgroundCache()
+font_registry = FontRegistry()
+layer_cache = LayerCache()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Bulk headless card rendering from CSV or JSONL trade files
+Trades are streamed from disk, prices are fetched once per chain and cards
+are rendered across all cores with a bounded number in flight, so memory
+stays flat however large the input is
+
+Each trade needs username, coin_name, bought_amount and sold_amount, and may
+set chain (default SOL) and theme (default cyberpunk).
+
+Usage:
+    python batch_render.py trades.csv --out cards/
+    python batch_render.py trades.jsonl --zip weekly_recap.zip --workers 8
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+# Add the current directory to Python path so we can import our modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from card import PNLCard, warm_theme_assets
+from prices import SUPPORTED_CHAINS, close_session, price_provider
+
+
+def read_trades(path: str) -> Iterator[Tuple[int, Union[Dict, str]]]:
+    """Yield (line number, row) from a CSV or JSONL file without loading it all
+
+    JSONL rows are yielded as raw lines and parsed by build_card, so a bad
+    line is reported like any other invalid trade
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if line:
+                    yield line_number, line
+        else:
+            for line_number, row in enumerate(csv.DictReader(f), 2):
+                yield line_number, row
+
+
+def build_card(row: Union[Dict, str], prices: Dict[str, float], default_theme: str) -> PNLCard:
+    """Validate a trade row and turn it into a card"""
+    if isinstance(row, str):
+        row = json.loads(row)
+    if not isinstance(row, dict):
+        raise ValueError("trade must be a JSON object")
+    chain = str(row.get('chain') or 'SOL').upper()
+    if chain not in SUPPORTED_CHAINS:
+        raise ValueError(f"unsupported chain {chain}")
+    return PNLCard(
+        username=str(row['username']),
+        coin_name=str(row['coin_name']),
+        bought_amount=float(row['bought_amount']),
+        sold_amount=float(row['sold_amount']),
+        token_price=prices[chain],
+        chain=chain,
+        theme=str(row.get('theme') or default_theme),
+    )
+
+
+def render(card: PNLCard) -> bytes:
+    """Render a card inside a worker"""
+    return card.generate_card(use_cache=False).getvalue()
+
+
+def fetch_prices(overrides: Dict[str, float]) -> Dict[str, float]:
+    """Fetch every chain's price once, falling back per chain when unavailable"""
+    async def fetch():
+        try:
+            return await price_provider.fetch_all()
+        except Exception as e:
+            print(f"❌ Price fetch failed, using fallback prices: {e}")
+            return {}
+        finally:
+            await close_session()
+
+    prices = {} if len(overrides) == len(SUPPORTED_CHAINS) else asyncio.run(fetch())
+    resolved = {}
+    for chain, info in SUPPORTED_CHAINS.items():
+        resolved[chain] = overrides.get(chain, prices.get(chain, info['fallback_price']))
+    return resolved
+
+
+def safe_name(value: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', value).strip('_')[:40] or 'card'
+
+
+class CardWriter:
+    """Writes finished cards to a directory or a zip archive"""
+
+    def __init__(self, out_dir: Optional[str], zip_path: Optional[str]):
+        self.out_dir = out_dir
+        self.archive = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) if zip_path else None
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, name: str, data: bytes):
+        if self.archive is not None:
+            # Card images are already compressed
+            self.archive.writestr(name, data)
+        else:
+            with open(os.path.join(self.out_dir, name), 'wb') as f:
+                f.write(data)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+def parse_price_overrides(values) -> Dict[str, float]:
+    overrides = {}
+    for value in values or []:
+        chain, _, price = value.partition('=')
+        overrides[chain.upper()] = float(price)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render PNL cards in bulk from a trade file')
+    parser.add_argument('trades', help='CSV or JSONL file of trades')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--out', help='directory to write card images to')
+    target.add_argument('--zip', help='zip archive to write card images to')
+    parser.add_argument('--workers', type=int, default=config.RENDER_WORKERS, help='render processes')
+    parser.add_argument('--theme', default='cyberpunk', help='theme for rows that do not set one')
+    parser.add_argument('--price', action='append', metavar='CHAIN=USD',
+                        help='fixed price for a chain instead of fetching it, e.g. SOL=150')
+    args = parser.parse_args()
+
+    trades_path = os.path.abspath(args.trades)
+    out_dir = os.path.abspath(args.out) if args.out else None
+    zip_path = os.path.abspath(args.zip) if args.zip else None
+    # Theme assets are referenced relative to the project root
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    prices = fetch_prices(parse_price_overrides(args.price))
+    print("💰 Prices: " + ", ".join(f"{chain} ${price:,.2f}" for chain, price in prices.items()))
+
+    workers = max(1, args.workers)
+    max_in_flight = workers * 4
+    writer = CardWriter(out_dir, zip_path)
+    rendered = failed = 0
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_theme_assets) as executor:
+        pending = {}
+
+        def collect(done):
+            nonlocal rendered, failed
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    writer.write(name, future.result())
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ {name}: {e}")
+                    continue
+                rendered += 1
+                if rendered % 100 == 0:
+                    print(f"   {rendered} cards ({rendered / (time.perf_counter() - started):.1f}/s)")
+
+        try:
+            for line_number, row in read_trades(trades_path):
+                try:
+                    card = build_card(row, prices, args.theme)
+                except (KeyError, ValueError, TypeError) as e:
+                    failed += 1
+                    print(f"❌ Line {line_number}: invalid trade ({e})")
+                    continue
+
+                name = f"{line_number:06d}_{safe_name(card.username)}_{safe_name(card.coin_name)}.{card.file_extension}"
+                pending[executor.submit(render, card)] = name
+                # Keep a bounded window in flight so memory doesn't grow with the input
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        finally:
+            writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Rendered {rendered} card(s), {failed} failed, in {elapsed:.1f}s "
+          f"({rendered / elapsed if elapsed else 0:.1f} cards/s)")
+    print(f"📁 Output: {zip_path or out_dir}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
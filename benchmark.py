@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Headless render benchmark for PNL cards
+Renders N cards per theme at a fixed price, times every render stage and
+writes the results as JSON so runs from different versions can be compared
+
+Usage:
+    python benchmark.py -n 100 --output bench_results.json
+    python benchmark.py -n 100 --compare bench_results.json
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+# Add the current directory to Python path so we can import our modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import PIL
+
+import config
+from card import THEMES, PNLCard, warm_theme_assets
+from card_cache import card_cache
+
+STAGES = ('background', 'draw', 'glow', 'composite', 'encode')
+MEMORY_FIELDS = ('peak_rss_kb', 'tracemalloc_peak_kb', 'images')
+FIXED_PRICE = 150.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and mean of a list of seconds, reported in milliseconds"""
+    return {
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'mean_ms': (sum(samples) / len(samples) * 1000) if samples else 0.0,
+    }
+
+
+def summarize_memory(samples: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """p50/p95/max of each per-render memory figure that was measured"""
+    summary = {}
+    for field in MEMORY_FIELDS:
+        values = [sample[field] for sample in samples if sample.get(field) is not None]
+        if values:
+            summary[field] = {'p50': percentile(values, 50), 'p95': percentile(values, 95), 'max': max(values)}
+    return summary
+
+
+def sample_card(theme: str, i: int) -> PNLCard:
+    """A distinct trade per iteration so glow sprites and the card cache can't hide work"""
+    bought = 10.0 + i
+    sold = bought * (0.5 + (i % 7) * 0.4)
+    return PNLCard(f'Trader{i}', f'COIN{i % 50}', bought, sold, FIXED_PRICE, 'SOL', theme)
+
+
+def bench_theme(theme: str, count: int) -> Dict:
+    """Render `count` cards of one theme and collect stage timings and memory"""
+    warm_theme_assets()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    stage_samples = {stage: [] for stage in STAGES}
+    totals = []
+    sizes = []
+    memory = []
+
+    tracemalloc.start()
+    for i in range(count):
+        card = sample_card(theme, i)
+        start = time.perf_counter()
+        card.generate_card(use_cache=False, measure_memory=True)
+        totals.append(time.perf_counter() - start)
+        sizes.append(card.encode_info['bytes'])
+        memory.append(card.memory)
+        for stage in STAGES:
+            stage_samples[stage].append(card.timings.get(stage, 0.0))
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Cache hit path: render once, then time repeated lookups of the same card
+    card_cache.clear()
+    sample_card(theme, 0).generate_card()
+    hits = []
+    for _ in range(count):
+        start = time.perf_counter()
+        sample_card(theme, 0).generate_card()
+        hits.append(time.perf_counter() - start)
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'theme': theme,
+        'count': count,
+        'total': summarize(totals),
+        'stages': {stage: summarize(samples) for stage, samples in stage_samples.items()},
+        'cache_hit': summarize(hits),
+        'cards_per_sec': count / sum(totals) if totals else 0.0,
+        'avg_bytes': sum(sizes) / len(sizes) if sizes else 0,
+        'peak_rss_kb': peak_rss,
+        'rss_growth_kb': peak_rss - baseline_rss,
+        'tracemalloc_peak_kb': traced_peak // 1024,
+        'per_render': summarize_memory(memory),
+    }
+
+
+def run_isolated(theme: str, count: int) -> Dict:
+    """Benchmark a theme in a fresh process so its peak memory isn't shared with others"""
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        return pool.apply(bench_theme, (theme, count))
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current: Dict, baseline: Dict):
+    """Print p50/p95 changes against an earlier results file"""
+    print(f"\n📊 Compared with {baseline['meta']['revision']} ({baseline['meta']['timestamp']})")
+    previous = {result['theme']: result for result in baseline['results']}
+    for result in current['results']:
+        old = previous.get(result['theme'])
+        if old is None:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            before, after = old['total'][key], result['total'][key]
+            change = (after - before) / before * 100 if before else 0.0
+            marker = '🔺' if change > 10 else '✅'
+            print(f"   {marker} {result['theme']:<10} {key}: {before:8.1f} → {after:8.1f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PNL card rendering')
+    parser.add_argument('-n', '--count', type=int, default=50, help='cards to render per theme')
+    parser.add_argument('--themes', nargs='+', default=list(THEMES), choices=list(THEMES))
+    parser.add_argument('--output', default='bench_results.json', help='where to write JSON results')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+    args.output = os.path.abspath(args.output)
+    args.compare = os.path.abspath(args.compare) if args.compare else None
+
+    # Theme assets are referenced relative to the project root
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    print(f"⏱️  Benchmarking {args.count} cards per theme ({config.CARD_FORMAT})")
+    print("=" * 60)
+
+    results = []
+    for theme in args.themes:
+        result = run_isolated(theme, args.count)
+        results.append(result)
+        total = result['total']
+        print(f"🎨 {theme:<10} p50 {total['p50_ms']:7.1f}ms  p95 {total['p95_ms']:7.1f}ms  "
+              f"p99 {total['p99_ms']:7.1f}ms  {result['cards_per_sec']:.1f} cards/s")
+        for stage in STAGES:
+            stats = result['stages'][stage]
+            print(f"     {stage:<10} p50 {stats['p50_ms']:7.1f}ms  p95 {stats['p95_ms']:7.1f}ms  p99 {stats['p99_ms']:7.1f}ms")
+        print(f"     cache hit  p50 {result['cache_hit']['p50_ms']:7.3f}ms")
+        print(f"     peak RSS {result['peak_rss_kb'] / 1024:.1f}MB (+{result['rss_growth_kb'] / 1024:.1f}MB), "
+              f"avg size {result['avg_bytes'] / 1024:.0f}KB")
+        per_render = result['per_render']
+        if 'peak_rss_kb' in per_render:
+            print(f"     per render peak RSS p50 {per_render['peak_rss_kb']['p50'] / 1024:.1f}MB  "
+                  f"p95 {per_render['peak_rss_kb']['p95'] / 1024:.1f}MB")
+        if 'tracemalloc_peak_kb' in per_render:
+            print(f"     per render tracemalloc p50 {per_render['tracemalloc_peak_kb']['p50']:.0f}KB  "
+                  f"p95 {per_render['tracemalloc_peak_kb']['p95']:.0f}KB, "
+                  f"{per_render['images']['p50']:.0f} images allocated")
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'cpu_count': os.cpu_count(),
+            'format': config.CARD_FORMAT,
+            'size': [config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT],
+        },
+        'results': results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+    if baseline is not None:
+        compare(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
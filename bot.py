@@ -1,339 +1,178 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
+import functools
+import hashlib
+import json
 import os
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
-import io
-from typing import Optional
+import signal
+import time
+from typing import Optional, Set
 import config
-import aiohttp
+from card import PNLCard, THEMES
+from card_cache import card_cache
+from metrics import (command_errors_total, command_sync_seconds, command_sync_total, phase_seconds, registry,
+                     start_loop_monitor, startup_seconds)
+from portfolio import PortfolioCard, parse_trades, summarize
+from prices import SUPPORTED_CHAINS, close_session, get_token_price
+from render_api import add_routes as add_render_routes
+from render_pool import render_pool
+from scheduler import SchedulerBusy, render_scheduler
+from theme_reload import theme_watcher
+from uploads import BackgroundRejected, background_uploads
 from aiohttp import web
-import requests
 import asyncio
 
-# Bot setup
-intents = discord.Intents.default()
-intents.message_content = True
-bot = commands.Bot(command_prefix=config.COMMAND_PREFIX, intents=intents)
-
-# Supported chains with their CoinGecko IDs and display symbols
-SUPPORTED_CHAINS = {
-    'SOL': {'id': 'solana', 'symbol': 'SOL', 'fallback_price': 100.0},
-    'BNB': {'id': 'binancecoin', 'symbol': 'BNB', 'fallback_price': 300.0},
-    'ETH': {'id': 'ethereum', 'symbol': 'ETH', 'fallback_price': 2000.0},
-}
-
-# Theme configurations
-THEMES = {
-    'cyberpunk': {
-        'background': 'backgrounds/background.jpg',
-        'fonts': {
-            'title': ('fonts/ShareTechMono-Regular.ttf', 24),
-            'large': ('fonts/ShareTechMono-Regular.ttf', 24),
-            'medium': ('fonts/ShareTechMono-Regular.ttf', 24),
-            'small': ('fonts/ShareTechMono-Regular.ttf', 24),
-        },
-        'colors': {
-            'profit': (0, 255, 255),
-            'loss': (255, 50, 50),
-            'text': (255, 255, 255),
-            'muted': (120, 120, 120),
-            'accent': (0, 255, 255),
-        }
-    },
-    'jjk': {
-        'background': 'backgrounds/jjk.webp',
-        'fonts': {
-            'title': ('fonts/PressStart2P.ttf', 32),
-            'large': ('fonts/VT323-Regular.ttf', 85),
-            'medium': ('fonts/VT323-Regular.ttf', 42),
-            'small': ('fonts/VT323-Regular.ttf', 34),
-        },
-        'colors': {
-            'profit': (255, 220, 50),
-            'loss': (255, 50, 50),
-            'text': (255, 255, 255),
-            'muted': (150, 150, 150),
-            'accent': (255, 120, 0),
-        }
-    },
-    'toji': {
-        'background': 'backgrounds/toji.jpg',
-        'fonts': {
-            'title': ('fonts/PressStart2P.ttf', 32),
-            'large': ('fonts/VT323-Regular.ttf', 85),
-            'medium': ('fonts/VT323-Regular.ttf', 42),
-            'small': ('fonts/VT323-Regular.ttf', 34),
-        },
-        'colors': {
-            'profit': (255, 190, 60),      # Amber gold (matches lights)
-            'loss': (180, 50, 50),          # Dark red
-            'text': (255, 240, 220),        # Warm cream white
-            'muted': (160, 140, 110),       # Muted brown/tan
-            'accent': (255, 170, 50),       # Golden amber
-        }
-    }
-}
-
-async def get_token_price(chain: str = 'SOL'):
-    """Get current token price from CoinGecko API"""
-    chain_info = SUPPORTED_CHAINS.get(chain.upper(), SUPPORTED_CHAINS['SOL'])
-    token_id = chain_info['id']
-    fallback_price = chain_info['fallback_price']
+BUSY_MESSAGE = "⏳ The card printer is busy right now, please try again in a minute."
+PREVIEW_MESSAGE = "⏳ Draft preview, the full card is on its way..."
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f'https://api.coingecko.com/api/v3/simple/price?ids={token_id}&vs_currencies=usd') as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data[token_id]['usd']
-                else:
-                    fallback_response = requests.get(f'https://api.coingecko.com/api/v3/simple/price?ids={token_id}&vs_currencies=usd')
-                    if fallback_response.status_code == 200:
-                        return fallback_response.json()[token_id]['usd']
-                    else:
-                        return fallback_price
-    except Exception as e:
-        print(f"Error fetching {chain} price: {e}")
-        return fallback_price
-
-
-class PNLCard:
-    def __init__(self, username: str, coin_name: str, bought_amount: float, sold_amount: float,
-                 token_price: float, chain: str = 'SOL', theme: str = 'cyberpunk'):
-        self.username = username
-        self.coin_name = coin_name.upper()
-        self.chain = chain.upper()
-        self.bought_amount = bought_amount
-        self.sold_amount = sold_amount
-        self.token_price = token_price
-        self.theme = theme.lower() if theme.lower() in THEMES else 'cyberpunk'
-        self.theme_config = THEMES[self.theme]
-
-        # Calculate values
-        self.bought_usd = bought_amount * token_price
-        self.sold_usd = sold_amount * token_price
-        self.pnl_amount = sold_amount - bought_amount
-        self.pnl_usd = self.pnl_amount * token_price
-        self.is_profit = self.pnl_amount > 0
-        self.multiplier = sold_amount / bought_amount if bought_amount > 0 else 0
-
-    def generate_card(self) -> io.BytesIO:
-        """Generate the PNL card based on theme"""
-        if self.theme in ['jjk', 'toji']:
-            return self._generate_jjk_card()
-        else:
-            return self._generate_cyberpunk_card()
 
-    def _generate_cyberpunk_card(self) -> io.BytesIO:
-        """Generate cyberpunk themed card"""
-        width, height = config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT
+class DrainOnClose:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Slash command handlers still running, see tracked()
+        self.handlers: Set[asyncio.Task] = set()
+        self._terminating: Optional[asyncio.Task] = None
 
-        # Load background
-        bg_path = self.theme_config['background']
+    async def setup_hook(self):
+        # Deploys and restarts stop the process with SIGTERM, shut down as cleanly as on Ctrl+C
         try:
-            if os.path.exists(bg_path):
-                bg_img = Image.open(bg_path)
-                bg_img = bg_img.resize((width, height), Image.Resampling.LANCZOS)
-            else:
-                bg_img = self._create_cyberpunk_background(width, height)
-        except:
-            bg_img = self._create_cyberpunk_background(width, height)
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self._terminate)
+        except NotImplementedError:
+            pass
 
-        draw = ImageDraw.Draw(bg_img)
+    def _terminate(self):
+        if self._terminating is None:
+            print("🛑 SIGTERM received, shutting down")
+            self._terminating = asyncio.get_running_loop().create_task(self.close())
 
-        # Load fonts
-        fonts = self.theme_config['fonts']
-        colors = self.theme_config['colors']
+    async def close(self):
+        # Let renders that already started finish before the connection goes away
+        await render_scheduler.drain(timeout=config.RENDER_DEADLINE)
+        # Their handlers still have to send the finished cards, the HTTP client closes below
+        handlers = self.handlers - {asyncio.current_task()}
+        if handlers:
+            print(f"⏳ Waiting for {len(handlers)} command(s) to reply")
+            await asyncio.wait(handlers, timeout=config.SHUTDOWN_REPLY_TIMEOUT)
+        # Joining the worker processes blocks, keep it off the loop so the gateway closes cleanly
+        await asyncio.to_thread(render_pool.shutdown)
+        await close_session()
+        await super().close()
 
-        try:
-            label_font = ImageFont.truetype(fonts['medium'][0], fonts['medium'][1])
-            value_font = ImageFont.truetype(fonts['medium'][0], fonts['medium'][1])
-            small_font = ImageFont.truetype(fonts['small'][0], fonts['small'][1])
-            large_font = ImageFont.truetype(fonts['large'][0], fonts['large'][1])
-        except:
-            label_font = value_font = small_font = large_font = ImageFont.load_default()
-
-        # Draw corner brackets
-        self._draw_corner_brackets(draw, width, height, colors['accent'])
-
-        # Positions
-        left_x = 100
-        y_coin, y_profit, y_profit_usd = 130, 192, 225
-        y_bought, y_bought_usd = 287, 320
-        y_sold, y_sold_usd = 382, 415
-        y_user, y_bottom = 472, 505
-
-        # Coin name
-        draw.text((left_x, y_coin), f"> {self.coin_name}", fill=colors['text'], font=label_font)
-
-        # Profit/Loss
-        pnl_formatted = f"{abs(self.pnl_amount)/1000:.1f}K" if abs(self.pnl_amount) >= 1000 else f"{abs(self.pnl_amount):.1f}"
-        profit_text = f"PROFIT: +{pnl_formatted} {self.chain}" if self.is_profit else f"LOSS: -{pnl_formatted} {self.chain}"
-        profit_color = colors['profit'] if self.is_profit else colors['loss']
-        draw.text((left_x, y_profit), profit_text, fill=profit_color, font=large_font)
-
-        pnl_usd_formatted = f"{abs(self.pnl_usd)/1000:.1f}K" if abs(self.pnl_usd) >= 1000 else f"{abs(self.pnl_usd):.1f}"
-        draw.text((left_x, y_profit_usd), f"> ${pnl_usd_formatted}", fill=colors['accent'], font=small_font)
-
-        # Bought
-        draw.text((left_x, y_bought), f"BOUGHT: {self.bought_amount:.1f} {self.chain}", fill=colors['muted'], font=value_font)
-        bought_usd_formatted = f"{self.bought_usd/1000:.1f}K" if self.bought_usd >= 1000 else f"{self.bought_usd:.1f}"
-        draw.text((left_x, y_bought_usd), f"> ${bought_usd_formatted}", fill=(44,44,44), font=small_font)
-
-        # Sold
-        draw.text((left_x, y_sold), f"SOLD: {self.sold_amount:.1f} {self.chain}", fill=colors['muted'], font=value_font)
-        sold_usd_formatted = f"{self.sold_usd/1000:.1f}K" if self.sold_usd >= 1000 else f"{self.sold_usd:.1f}"
-        draw.text((left_x, y_sold_usd), f"> ${sold_usd_formatted}", fill=(44,44,44), font=small_font)
-
-        # User
-        draw.text((left_x, y_user), f"USER: {self.username.upper()}", fill=colors['muted'], font=value_font)
-        draw.text((left_x, y_bottom), f"> {self.chain}", fill=(44,44,44), font=small_font)
-
-        output = io.BytesIO()
-        bg_img.save(output, format='PNG')
-        output.seek(0)
-        return output
-
-    def _generate_jjk_card(self) -> io.BytesIO:
-        """Generate JJK/fire themed card with retro terminal style"""
-        width, height = config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT
-
-        # Load background
-        bg_path = self.theme_config['background']
-        try:
-            if os.path.exists(bg_path):
-                bg_img = Image.open(bg_path).convert("RGBA")
-                bg_img = bg_img.resize((width, height), Image.Resampling.LANCZOS)
-            else:
-                bg_img = Image.new('RGBA', (width, height), (30, 20, 10, 255))
-        except:
-            bg_img = Image.new('RGBA', (width, height), (30, 20, 10, 255))
 
-        overlay = Image.new('RGBA', bg_img.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(overlay)
+class PNLBot(DrainOnClose, commands.Bot):
+    pass
+
 
-        # Load fonts
-        fonts = self.theme_config['fonts']
-        colors = self.theme_config['colors']
+class ShardedPNLBot(DrainOnClose, commands.AutoShardedBot):
+    pass
 
+
+# Bot setup
+intents = discord.Intents.default()
+intents.message_content = True
+if config.SHARD_COUNT:
+    bot = ShardedPNLBot(command_prefix=config.COMMAND_PREFIX, intents=intents,
+                        shard_count=config.SHARD_COUNT, shard_ids=config.SHARD_IDS or None)
+else:
+    bot = PNLBot(command_prefix=config.COMMAND_PREFIX, intents=intents)
+
+_process_started = time.perf_counter()
+_first_ready = True
+_webserver_started = False
+
+
+def tracked(handler):
+    """Record a slash command handler's task while it runs, so close() can wait for its reply"""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        task = asyncio.current_task()
+        bot.handlers.add(task)
         try:
-            font_title = ImageFont.truetype(fonts['title'][0], fonts['title'][1])
-            font_big = ImageFont.truetype(fonts['large'][0], fonts['large'][1])
-            font_med = ImageFont.truetype(fonts['medium'][0], fonts['medium'][1])
-            font_small = ImageFont.truetype(fonts['small'][0], fonts['small'][1])
-        except:
-            font_title = font_big = font_med = font_small = ImageFont.load_default()
-
-        # Dark panel
-        draw.rectangle([0, 0, 300, height], fill=(0, 0, 0, 240))
-        for i in range(300, 420):
-            alpha = int(240 * (1 - (i - 300) / 120))
-            draw.line([(i, 0), (i, height)], fill=(0, 0, 0, alpha))
-
-        # Coin name with glow
-        coin_text = f"${self.coin_name}"
-        glow_layer = Image.new('RGBA', bg_img.size, (0, 0, 0, 0))
-        glow_draw = ImageDraw.Draw(glow_layer)
-        for offset in range(8, 0, -2):
-            glow_draw.text((45-offset, 35-offset), coin_text, font=font_title, fill=(255, 150, 0, 40))
-            glow_draw.text((45+offset, 35+offset), coin_text, font=font_title, fill=(255, 150, 0, 40))
-        glow_layer = glow_layer.filter(ImageFilter.GaussianBlur(4))
-        overlay = Image.alpha_composite(overlay, glow_layer)
-        draw = ImageDraw.Draw(overlay)
-        draw.text((45, 35), coin_text, font=font_title, fill=colors['text'])
-
-        # Multiplier with glow
-        mult_text = f"{self.multiplier:.1f}X"
-        mult_color = colors['profit'] if self.is_profit else colors['loss']
-        glow2 = Image.new('RGBA', bg_img.size, (0, 0, 0, 0))
-        glow2_draw = ImageDraw.Draw(glow2)
-        glow2_draw.text((45, 85), mult_text, font=font_big, fill=(*mult_color[:3], 60))
-        glow2 = glow2.filter(ImageFilter.GaussianBlur(10))
-        overlay = Image.alpha_composite(overlay, glow2)
-        draw = ImageDraw.Draw(overlay)
-        draw.text((45, 90), mult_text, font=font_big, fill=mult_color)
-
-        # Profit USD
-        profit_sign = "+" if self.is_profit else "-"
-        usd_formatted = f"{profit_sign}${abs(self.pnl_usd)/1000:.1f}K" if abs(self.pnl_usd) >= 1000 else f"{profit_sign}${abs(self.pnl_usd):,.0f}"
-        draw.text((45, 180), usd_formatted, font=font_med, fill=colors['accent'])
-
-        # Stats
-        draw.text((35, 255), "> INVESTED", font=font_small, fill=colors['muted'])
-        draw.text((220, 255), f"{self.bought_amount:.1f} {self.chain}", font=font_small, fill=colors['text'])
-
-        draw.text((35, 310), "> RETURNED", font=font_small, fill=colors['muted'])
-        draw.text((220, 310), f"{self.sold_amount:.1f} {self.chain}", font=font_small, fill=colors['text'])
-
-        draw.text((35, 365), "> PROFIT", font=font_small, fill=colors['muted'])
-        pnl_formatted = f"{profit_sign}{abs(self.pnl_amount)/1000:.1f}K" if abs(self.pnl_amount) >= 1000 else f"{profit_sign}{abs(self.pnl_amount):.1f}"
-        draw.text((220, 365), f"{pnl_formatted} {self.chain}", font=font_small, fill=mult_color)
-
-        # Username with cursor
-        draw.text((35, 450), f"@{self.username.upper()}", font=font_med, fill=colors['accent'])
-        cursor_x = 35 + len(f"@{self.username.upper()}") * 21
-        draw.rectangle([cursor_x, 455, cursor_x + 18, 490], fill=colors['accent'])
-
-        # Decorative corners
-        acc = colors['accent'] + (200,)
-        draw.line([(18, 18), (75, 18)], fill=acc, width=3)
-        draw.line([(18, 18), (18, 75)], fill=acc, width=3)
-        draw.line([(18, 650), (75, 650)], fill=acc, width=3)
-        draw.line([(18, 593), (18, 650)], fill=acc, width=3)
-
-        # Scanlines
-        for y in range(0, height, 4):
-            draw.line([(0, y), (width, y)], fill=(0, 0, 0, 20))
-
-        result = Image.alpha_composite(bg_img, overlay)
-        output = io.BytesIO()
-        result.convert('RGB').save(output, format='PNG')
-        output.seek(0)
-        return output
-
-    def _create_cyberpunk_background(self, width: int, height: int) -> Image.Image:
-        """Create a cyberpunk-themed background"""
-        img = Image.new('RGB', (width, height), color=(15, 25, 35))
-        draw = ImageDraw.Draw(img)
-
-        grid_color = (25, 35, 45)
-        for x in range(0, width, 40):
-            draw.line([(x, 0), (x, height)], fill=grid_color, width=1)
-        for y in range(0, height, 40):
-            draw.line([(0, y), (width, y)], fill=grid_color, width=1)
-
-        accent_color = (0, 100, 120)
-        draw.rectangle([10, 10, width-10, height-10], outline=accent_color, width=2)
-
-        return img
-
-    def _draw_corner_brackets(self, draw, width: int, height: int, color):
-        """Draw corner brackets"""
-        bracket_size, bracket_width = 30, 3
-
-        draw.line([(20, 20), (20 + bracket_size, 20)], fill=color, width=bracket_width)
-        draw.line([(20, 20), (20, 20 + bracket_size)], fill=color, width=bracket_width)
-        draw.line([(width - 20, 20), (width - 20 - bracket_size, 20)], fill=color, width=bracket_width)
-        draw.line([(width - 20, 20), (width - 20, 20 + bracket_size)], fill=color, width=bracket_width)
-        draw.line([(20, height - 20), (20 + bracket_size, height - 20)], fill=color, width=bracket_width)
-        draw.line([(20, height - 20), (20, height - 20 - bracket_size)], fill=color, width=bracket_width)
-        draw.line([(width - 20, height - 20), (width - 20 - bracket_size, height - 20)], fill=color, width=bracket_width)
-        draw.line([(width - 20, height - 20), (width - 20, height - 20 - bracket_size)], fill=color, width=bracket_width)
+            return await handler(*args, **kwargs)
+        finally:
+            bot.handlers.discard(task)
+    return wrapper
 
 
-@bot.event
-async def on_ready():
-    print(f'{bot.user} has landed on the trading seas!')
+def command_tree_fingerprint() -> str:
+    """Hash of the serialized slash command definitions for this application"""
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    serialized = json.dumps({'application_id': bot.application_id, 'commands': payload},
+                            sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
 
-    if not os.path.exists(config.BACKGROUNDS_FOLDER):
-        os.makedirs(config.BACKGROUNDS_FOLDER)
+
+async def sync_command_tree():
+    """Sync slash commands with Discord only when their definitions changed since the last sync"""
+    start = time.perf_counter()
+    fingerprint = command_tree_fingerprint()
+    try:
+        with open(config.COMMAND_TREE_HASH_FILE, 'r') as f:
+            synced_fingerprint = f.read().strip()
+    except OSError:
+        synced_fingerprint = None
 
     try:
+        if fingerprint == synced_fingerprint:
+            command_sync_total.inc(result='skipped')
+            print('⚡ Slash commands unchanged, skipping sync')
+            return
+
         synced = await bot.tree.sync()
+        with open(config.COMMAND_TREE_HASH_FILE, 'w') as f:
+            f.write(fingerprint)
+        command_sync_total.inc(result='synced')
         print(f'⚡ Synced {len(synced)} slash command(s)')
     except Exception as e:
+        command_sync_total.inc(result='failed')
         print(f'❌ Failed to sync slash commands: {e}')
+    finally:
+        command_sync_seconds.set(time.perf_counter() - start)
+
+
+@bot.event
+async def on_ready():
+    global _first_ready
+    print(f'{bot.user} has landed on the trading seas!')
+
+    # on_ready fires again after every reconnect, only set up once
+    if not _first_ready:
+        return
+    _first_ready = False
+
+    if not os.path.exists(config.BACKGROUNDS_FOLDER):
+        os.makedirs(config.BACKGROUNDS_FOLDER)
+    os.makedirs(config.BACKGROUND_UPLOAD_DIR, exist_ok=True)
+
+    # Warming the workers blocks, keep it off the loop so the gateway heartbeat keeps going
+    await asyncio.to_thread(render_pool.start)
+    start_loop_monitor()
+    theme_watcher.start()
+    if config.COMMAND_SYNC:
+        await sync_command_tree()
+
+    startup_seconds.set(time.perf_counter() - _process_started)
+    print(f'🚀 Ready in {startup_seconds.value():.1f}s (command sync {command_sync_seconds.value():.2f}s)')
+
+
+def wants_preview(card: PNLCard, key: str) -> bool:
+    """Whether the full card will take long enough that a draft is worth sending first"""
+    if not config.CARD_PREVIEW or key in card_cache:
+        return False
+    if card.animated:
+        return True
+    expected = render_scheduler.estimated_wait() + render_scheduler.render_seconds
+    return expected >= config.CARD_PREVIEW_MIN_WAIT
+
+
+async def store_background(attachment: discord.Attachment) -> str:
+    """Store an attached background and return its digest, refusing oversized files before downloading"""
+    if attachment.size > config.BACKGROUND_UPLOAD_MAX_BYTES:
+        raise BackgroundRejected(f"Background is too large (max {config.BACKGROUND_UPLOAD_MAX_BYTES // (1024 * 1024)}MB).")
+    data = await attachment.read()
+    # Decoding a new upload takes a while, reused ones only hash
+    return await asyncio.to_thread(background_uploads.add, data)
 
 
 @bot.tree.command(name='pnl', description='Create a custom PNL trading card')
@@ -343,7 +182,9 @@ async def on_ready():
     bought_amount='How much of the native token you spent',
     sold_amount='How much of the native token you received',
     chain='The blockchain/native token (default: SOL)',
-    theme='Card theme style (default: cyberpunk)'
+    theme='Card theme style (default: cyberpunk)',
+    animated='Animate the card: numbers count up, the glow pulses and the cursor blinks',
+    background='Custom background image (PNG, JPEG, WebP or GIF), drawn under the theme'
 )
 @app_commands.choices(
     chain=[
@@ -357,24 +198,43 @@ async def on_ready():
         app_commands.Choice(name='Toji (Amber)', value='toji'),
     ]
 )
+@tracked
 async def slash_pnl(interaction: discord.Interaction, username: str, coin_name: str,
                     bought_amount: float, sold_amount: float,
                     chain: app_commands.Choice[str] = None,
-                    theme: app_commands.Choice[str] = None):
-    """Create a PNL card with direct input"""
+                    theme: app_commands.Choice[str] = None,
+                    animated: bool = False,
+                    background: Optional[discord.Attachment] = None):
+    """Create a PNL card with direct input
+
+    When the full card will take a while, a small draft is sent first and the
+    message is edited to the finished card once it's ready
+    """
+    preview_message = None
+
+    async def reply(content: str):
+        if preview_message is not None:
+            await preview_message.edit(content=content, embed=None, attachments=[])
+        else:
+            await interaction.followup.send(content, ephemeral=True)
+
     try:
-        await interaction.response.defer(ephemeral=True)
+        with phase_seconds.time(phase='defer'):
+            await interaction.response.defer(ephemeral=True)
 
         chain_value = chain.value if chain else 'SOL'
         theme_value = theme.value if theme else 'cyberpunk'
 
-        token_price = await get_token_price(chain_value)
+        background_digest = None
+        if background is not None:
+            with phase_seconds.time(phase='background'):
+                background_digest = await store_background(background)
 
-        pnl_card = PNLCard(username, coin_name, bought_amount, sold_amount,
-                          token_price, chain_value, theme_value)
-        card_image = pnl_card.generate_card()
+        with phase_seconds.time(phase='price'):
+            token_price = await get_token_price(chain_value)
 
-        discord_file = discord.File(card_image, filename=f"{username}_{coin_name.lower()}_pnl.png")
+        pnl_card = PNLCard(username, coin_name, bought_amount, sold_amount,
+                          token_price, chain_value, theme_value, animated, background_digest)
 
         embed = discord.Embed(
             title="🔒 Private Trading Report",
@@ -391,12 +251,107 @@ async def slash_pnl(interaction: discord.Interaction, username: str, coin_name:
         pnl_usd_formatted = f"{pnl_usd_abs/1000:.1f}K" if pnl_usd_abs >= 1000 else f"{pnl_usd_abs:.2f}"
         embed.add_field(name="P&L", value=f"{'+' if pnl_card.is_profit else '-'}{pnl_formatted} {chain_value} (${pnl_usd_formatted})", inline=False)
 
-        await interaction.followup.send(embed=embed, file=discord_file, ephemeral=True)
+        card_key = pnl_card.cache_key()
+        if wants_preview(pnl_card, card_key):
+            with phase_seconds.time(phase='preview'):
+                preview = await asyncio.to_thread(pnl_card.generate_preview)
+                preview_file = discord.File(preview, filename=f"{username}_{coin_name.lower()}_preview.jpg")
+                preview_message = await interaction.followup.send(
+                    PREVIEW_MESSAGE, embed=embed, file=preview_file, ephemeral=True, wait=True)
+
+        with phase_seconds.time(phase='render'):
+            card_image = await render_scheduler.render(interaction.user.id, pnl_card, key=card_key)
+
+        discord_file = discord.File(card_image, filename=f"{username}_{coin_name.lower()}_pnl.{pnl_card.file_extension}")
+
+        with phase_seconds.time(phase='upload'):
+            if preview_message is not None:
+                await preview_message.edit(content=None, embed=embed, attachments=[discord_file])
+            else:
+                await interaction.followup.send(embed=embed, file=discord_file, ephemeral=True)
 
+    except BackgroundRejected as e:
+        command_errors_total.inc(command='pnl', kind='invalid_background')
+        await reply(f"❌ {e}")
     except ValueError:
-        await interaction.followup.send("❌ Invalid input! Please use numbers for coin amounts.", ephemeral=True)
+        command_errors_total.inc(command='pnl', kind='invalid_input')
+        await reply("❌ Invalid input! Please use numbers for coin amounts.")
+    except SchedulerBusy:
+        command_errors_total.inc(command='pnl', kind='busy')
+        await reply(BUSY_MESSAGE)
+    except Exception as e:
+        command_errors_total.inc(command='pnl', kind=type(e).__name__)
+        await reply(f"❌ Error creating PNL card: {str(e)}")
+
+
+@bot.tree.command(name='portfolio', description='Create a summary card for many trades')
+@app_commands.describe(
+    username='Your username/trader name',
+    trades='Inline trades as COIN BOUGHT SOLD [CHAIN], separated by semicolons',
+    trade_file='CSV or JSONL file with coin_name, bought_amount, sold_amount and chain columns',
+    theme='Card theme style (default: cyberpunk)'
+)
+@app_commands.choices(
+    theme=[
+        app_commands.Choice(name='Cyberpunk (Teal)', value='cyberpunk'),
+        app_commands.Choice(name='JJK (Fire)', value='jjk'),
+        app_commands.Choice(name='Toji (Amber)', value='toji'),
+    ]
+)
+@tracked
+async def slash_portfolio(interaction: discord.Interaction, username: str,
+                          trades: Optional[str] = None,
+                          trade_file: Optional[discord.Attachment] = None,
+                          theme: app_commands.Choice[str] = None):
+    """Create a portfolio summary card from inline trades or an attached trade file"""
+    try:
+        await interaction.response.defer(ephemeral=True)
+
+        if trade_file is not None:
+            if trade_file.size > config.PORTFOLIO_MAX_BYTES:
+                await interaction.followup.send(f"❌ Trade file is too large (max {config.PORTFOLIO_MAX_BYTES // 1024}KB).", ephemeral=True)
+                return
+            text = (await trade_file.read()).decode('utf-8')
+        elif trades:
+            text = trades
+        else:
+            await interaction.followup.send("❌ Give trades inline or attach a trade file.", ephemeral=True)
+            return
+
+        # Parsing and aggregating a large trade file takes a while, keep it off the event loop
+        parsed = await asyncio.to_thread(parse_trades, text)
+        prices = {chain: await get_token_price(chain) for chain in SUPPORTED_CHAINS}
+        summary = await asyncio.to_thread(summarize, parsed, prices)
+
+        card = PortfolioCard(username, summary, theme.value if theme else 'cyberpunk')
+        card_image = await render_scheduler.render(interaction.user.id, card)
+        discord_file = discord.File(card_image, filename=f"{username}_portfolio.{card.file_extension}")
+
+        embed = discord.Embed(
+            title="🔒 Private Portfolio Report",
+            description=f"{summary['trades']} trades across {', '.join(summary['chains'])}",
+            color=0x00ff00 if card.is_profit else 0xff0000
+        )
+        embed.add_field(name="Trader", value=username, inline=True)
+        embed.add_field(name="Win Rate", value=f"{summary['win_rate'] * 100:.0f}%", inline=True)
+        embed.add_field(name="Total P&L", value=f"{'+' if card.is_profit else '-'}${abs(summary['pnl_usd']):,.2f}", inline=True)
+        embed.add_field(name="Best", value=f"{summary['best']['coin']} {summary['best']['multiplier']:.1f}X", inline=True)
+        embed.add_field(name="Worst", value=f"{summary['worst']['coin']} {summary['worst']['multiplier']:.1f}X", inline=True)
+        for chain, totals in summary['chains'].items():
+            embed.add_field(name=f"{chain} ({totals['trades']} trades)",
+                            value=f"{totals['pnl']:+,.2f} {chain} (${totals['pnl_usd']:+,.2f})", inline=False)
+
+        await interaction.followup.send(embed=embed, file=discord_file, ephemeral=True)
+
+    except (ValueError, UnicodeDecodeError) as e:
+        command_errors_total.inc(command='portfolio', kind='invalid_input')
+        await interaction.followup.send(f"❌ Invalid trades: {e}", ephemeral=True)
+    except SchedulerBusy:
+        command_errors_total.inc(command='portfolio', kind='busy')
+        await interaction.followup.send(BUSY_MESSAGE, ephemeral=True)
     except Exception as e:
-        await interaction.followup.send(f"❌ Error creating PNL card: {str(e)}", ephemeral=True)
+        command_errors_total.inc(command='portfolio', kind=type(e).__name__)
+        await interaction.followup.send(f"❌ Error creating portfolio card: {str(e)}", ephemeral=True)
 
 
 @bot.tree.command(name='info', description='Show information about the PNL Card Bot')
@@ -410,7 +365,13 @@ async def slash_info(interaction: discord.Interaction):
 
     embed.add_field(
         name="/pnl",
-        value="Create a **private** custom PNL card\nParameters:\n• username: Your trader name\n• coin_name: Token traded (BONK, PEPE, etc.)\n• bought_amount: Native tokens spent\n• sold_amount: Native tokens received\n• chain: SOL, BNB, or ETH\n• theme: cyberpunk, jjk, or toji",
+        value="Create a **private** custom PNL card\nParameters:\n• username: Your trader name\n• coin_name: Token traded (BONK, PEPE, etc.)\n• bought_amount: Native tokens spent\n• sold_amount: Native tokens received\n• chain: SOL, BNB, or ETH\n• theme: cyberpunk, jjk, or toji\n• animated: animated GIF card\n• background: your own background image",
+        inline=False
+    )
+
+    embed.add_field(
+        name="/portfolio",
+        value="Create a **private** summary card for many trades\nParameters:\n• username: Your trader name\n• trades: `COIN BOUGHT SOLD [CHAIN]` entries separated by `;`\n• trade_file: CSV/JSONL with coin_name, bought_amount, sold_amount, chain\n• theme: cyberpunk, jjk, or toji",
         inline=False
     )
 
@@ -422,7 +383,7 @@ async def slash_info(interaction: discord.Interaction):
 
     embed.add_field(
         name="Features",
-        value="✅ Private PNL cards (only you see them)\n✅ Multi-chain support (SOL, BNB, ETH)\n✅ Real-time price via CoinGecko\n✅ Auto multiplier calculation\n✅ Multiple themes",
+        value="✅ Private PNL cards (only you see them)\n✅ Multi-chain support (SOL, BNB, ETH)\n✅ Real-time price via CoinGecko\n✅ Auto multiplier calculation\n✅ Multiple themes\n✅ Custom background uploads",
         inline=False
     )
 
@@ -455,22 +416,39 @@ async def legacy_info(ctx):
 async def handle_ping(request):
     return web.Response(text="Bot is alive!")
 
+async def handle_metrics(request):
+    return web.Response(body=registry.render().encode('utf-8'),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
 async def run_webserver():
     app = web.Application()
     app.router.add_get('/', handle_ping)
+    app.router.add_get('/metrics', handle_metrics)
+    add_render_routes(app)
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', 8080)
+    site = web.TCPSite(runner, config.WEB_HOST, config.WEB_PORT)
     await site.start()
-    print("🌐 Keep-alive server running on port 8080")
+    print(f"🌐 Keep-alive server running on port {config.WEB_PORT}")
 
 @bot.event
 async def on_connect():
-    bot.loop.create_task(run_webserver())
+    # on_connect also fires on reconnects, the server only needs binding once
+    global _webserver_started
+    if not _webserver_started:
+        _webserver_started = True
+        bot.loop.create_task(run_webserver())
 
-if __name__ == "__main__":
+def main():
     if not config.DISCORD_TOKEN:
         print("❌ Please set DISCORD_TOKEN in your .env file")
         print("💡 Create a .env file with: DISCORD_TOKEN=your_bot_token_here")
     else:
+        if config.SHARD_COUNT:
+            shards = ','.join(map(str, config.SHARD_IDS)) or 'all'
+            print(f"🧩 Running shard(s) {shards} of {config.SHARD_COUNT}")
         bot.run(config.DISCORD_TOKEN)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+PNL card rendering
+Kept free of discord imports so render workers can load it cheaply
+"""
+
+import contextlib
+import hashlib
+import io
+import math
+import time
+from typing import Dict, Optional
+
+import config
+from assets import background_cache, font_registry, raw_store
+from card_cache import card_cache
+from encoding import ANIMATION_EXTENSIONS, EXTENSIONS, animation_settings, encode_animation, encode_image, output_settings
+from layout import DrawPlan, compiled_plan
+from memory_stats import measure
+from themes import THEMES
+from uploads import background_uploads
+
+
+class PNLCard:
+    def __init__(self, username: str, coin_name: str, bought_amount: float, sold_amount: float,
+                 token_price: float, chain: str = 'SOL', theme: str = 'cyberpunk', animated: bool = False,
+                 background: Optional[str] = None):
+        self.username = username
+        self.coin_name = coin_name.upper()
+        self.chain = chain.upper()
+        self.bought_amount = bought_amount
+        self.sold_amount = sold_amount
+        self.token_price = token_price
+        self.theme = theme.lower() if theme.lower() in THEMES else 'cyberpunk'
+        self.theme_config = THEMES[self.theme]
+        # Count the numbers up from zero over several frames instead of a still image
+        self.animated = animated
+        # Digest of an uploaded background drawn instead of the theme's own, see uploads.py
+        self.background = background
+
+        # Calculate values
+        self.bought_usd = bought_amount * token_price
+        self.sold_usd = sold_amount * token_price
+        self.pnl_amount = sold_amount - bought_amount
+        self.pnl_usd = self.pnl_amount * token_price
+        self.is_profit = self.pnl_amount > 0
+        self.multiplier = sold_amount / bought_amount if bought_amount > 0 else 0
+
+        # Size and time of the last encode, None until a card is rendered
+        self.encode_info = None
+        # Seconds spent in each render stage (background, draw, glow, composite, encode)
+        self.timings = {}
+        # Peak memory of the last render measured with generate_card(measure_memory=True)
+        self.memory = None
+
+    @property
+    def file_extension(self) -> str:
+        """Extension matching the theme's output format"""
+        if self.animated:
+            return ANIMATION_EXTENSIONS[animation_settings(self.theme)['format']]
+        return EXTENSIONS[output_settings(self.theme)['format']]
+
+    def generate_card(self, use_cache: bool = True, measure_memory: bool = False) -> io.BytesIO:
+        """Generate the PNL card based on theme, reusing a cached render when possible
+
+        `measure_memory` fills self.memory, see memory_stats.measure for when the figures are exact
+        """
+        key = self.cache_key() if use_cache else None
+        if key is not None:
+            data = card_cache.get(key)
+            if data is not None:
+                return io.BytesIO(data)
+
+        self.memory = {} if measure_memory else None
+        with measure(self.memory) if measure_memory else contextlib.nullcontext():
+            if self.animated:
+                output = self._generate_animation()
+            else:
+                img = self.draw_plan().render(self.card_text(), self.is_profit, self._stage)
+                with self._stage('encode'):
+                    output, self.encode_info = encode_image(img, output_settings(self.theme))
+                del img
+
+        if key is not None:
+            card_cache.put(key, output.getvalue())
+        return output
+
+    def generate_preview(self) -> io.BytesIO:
+        """Quick draft of the still card: no glows, shrunk and saved as a low quality JPEG"""
+        img = self.draw_plan().render(self.card_text(), self.is_profit, lambda name: contextlib.nullcontext(), glow=False)
+        if config.CARD_PREVIEW_SCALE > 1:
+            img = img.reduce(config.CARD_PREVIEW_SCALE)
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=config.CARD_PREVIEW_QUALITY)
+        output.seek(0)
+        return output
+
+    def draw_plan(self) -> DrawPlan:
+        """The theme's compiled layout at the configured card size, over the uploaded background if there is one"""
+        size = (config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+        if self.background:
+            return background_uploads.plan(self.theme, self.theme_config, self.background, size)
+        return compiled_plan(self.theme, self.theme_config, size)
+
+    def text_fields(self, progress: float = 1.0) -> Dict[str, str]:
+        """Formatted values available to the layout's text templates
+
+        `progress` scales the counting values (multiplier and PnL) for animation frames
+        """
+        def short(value: float) -> str:
+            return f"{value/1000:.1f}K" if value >= 1000 else f"{value:.1f}"
+
+        pnl_usd = abs(self.pnl_usd) * progress
+        return {
+            'coin': self.coin_name,
+            'chain': self.chain,
+            'user': self.username.upper(),
+            'sign': "+" if self.is_profit else "-",
+            'profit_word': "PROFIT" if self.is_profit else "LOSS",
+            'multiplier': f"{self.multiplier * progress:.1f}",
+            'bought': f"{self.bought_amount:.1f}",
+            'sold': f"{self.sold_amount:.1f}",
+            'pnl_k': short(abs(self.pnl_amount) * progress),
+            'pnl_usd_k': short(pnl_usd),
+            'pnl_usd_short': f"${pnl_usd/1000:.1f}K" if pnl_usd >= 1000 else f"${pnl_usd:,.0f}",
+            'bought_usd_k': short(self.bought_usd),
+            'sold_usd_k': short(self.sold_usd),
+        }
+
+    def card_text(self, progress: float = 1.0) -> Dict[str, str]:
+        """Every string the theme draws, formatted exactly as it appears on the card"""
+        fields = self.text_fields(progress)
+        return {name: template.format(**fields) for name, template in self.theme_config['layout']['text'].items()}
+
+    def cache_key(self) -> str:
+        """Content address of the rendered card
+
+        Built from the displayed strings rather than the raw inputs, so prices
+        that only differ below the card's display precision share an entry
+        """
+        plan = self.draw_plan()
+        parts = [self.theme, str(config.DEFAULT_CARD_WIDTH), str(config.DEFAULT_CARD_HEIGHT), str(self.is_profit)]
+        # Theme edits and replaced background or font files change the address too
+        parts += [plan.version, repr(plan.stamp)]
+        settings = animation_settings(self.theme) if self.animated else output_settings(self.theme)
+        parts += [f"{name}={value}" for name, value in sorted(settings.items())]
+        parts += [f"{name}={value}" for name, value in sorted(self.card_text().items())]
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    def _generate_animation(self) -> io.BytesIO:
+        """Generate an animated card: numbers count up, then the glow pulses and the cursor blinks"""
+        settings = animation_settings(self.theme)
+        count = settings['frames']
+        count_up = max(1, count * 3 // 5)
+
+        frames = []
+        for i in range(count):
+            # Ease out so the count slows into its final value
+            progress = 1 - (1 - min(1.0, (i + 1) / count_up)) ** 3
+            glow_scale = 0.7 + 0.3 * math.cos(2 * math.pi * i / 12)
+            cursor_visible = (i // 4) % 2 == 0
+            frames.append((self.card_text(progress), glow_scale, cursor_visible))
+        # Finish on the full card, as it looks when still
+        frames[-1] = (self.card_text(), 1.0, True)
+
+        images = self.draw_plan().render_frames(frames, self.is_profit, self._stage)
+        durations = [settings['frame_ms']] * (count - 1) + [settings['hold_ms']]
+        with self._stage('encode'):
+            output, self.encode_info = encode_animation(images, durations, settings)
+        return output
+
+    @contextlib.contextmanager
+    def _stage(self, name: str):
+        """Add the time spent in the block to self.timings[name]"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def warm_theme_assets():
+    """Load every theme's background and fonts and compile its layout in this process
+
+    The first process to warm stores backgrounds and static layers as raw
+    pixel files, later processes map them instead of decoding and drawing
+    """
+    size = (config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+    raw_store.prune()
+    for theme_name, theme_config in THEMES.items():
+        background_cache.warm(theme_config['background'], theme_config['layout'].get('mode', 'RGB'), size)
+        if not font_registry.warm(theme_config['fonts']):
+            print(f'❌ Theme {theme_name} is using fallback fonts')
+        compiled_plan(theme_name, theme_config, size).warm()
@@ -0,0 +1,166 @@
+"""
+Content-addressed cache of finished card images
+A byte-budgeted LRU in memory with an optional on-disk tier
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import config
+from metrics import card_cache_total
+
+
+class CardCache:
+    """Encoded card bytes keyed by PNLCard.cache_key()"""
+
+    def __init__(self, max_bytes: Optional[int] = None, disk_dir: Optional[str] = None,
+                 disk_max_bytes: Optional[int] = None):
+        self.max_bytes = config.CARD_CACHE_BYTES if max_bytes is None else max_bytes
+        self.disk_dir = config.CARD_CACHE_DIR if disk_dir is None else disk_dir
+        self.disk_max_bytes = config.CARD_CACHE_DISK_BYTES if disk_max_bytes is None else disk_max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.disk_size = self._scan_disk() if self.disk_dir else 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached bytes for a card, or None on a miss"""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, data)
+        return data
+
+    def __contains__(self, key: str) -> bool:
+        """Whether a card is cached, without counting a lookup"""
+        with self._lock:
+            if key in self._entries:
+                return True
+        return bool(self.disk_dir) and os.path.exists(self._path(key))
+
+    def put(self, key: str, data: bytes):
+        """Store a rendered card in memory and, if enabled, on disk"""
+        self._remember(key, data)
+        self._write_disk(key, data)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'disk_bytes': self.disk_size,
+            }
+
+    def clear(self):
+        """Drop every in-memory entry, the disk tier is left alone"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.card")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Touch so disk pruning keeps recently used cards
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _write_disk(self, key: str, data: bytes):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            existed = os.path.exists(path)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"❌ Failed to write card cache entry {path}: {e}")
+            return
+
+        if not existed:
+            with self._lock:
+                self.disk_size += len(data)
+            if self.disk_size > self.disk_max_bytes:
+                self._prune_disk()
+
+    def _scan_disk(self) -> int:
+        try:
+            return sum(entry.stat().st_size for entry in os.scandir(self.disk_dir)
+                       if entry.name.endswith('.card'))
+        except OSError:
+            return 0
+
+    def _prune_disk(self):
+        """Remove least recently used files until the disk tier is 90% of its budget"""
+        try:
+            files = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                     for entry in os.scandir(self.disk_dir) if entry.name.endswith('.card')]
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in files)
+        target = int(self.disk_max_bytes * 0.9)
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        with self._lock:
+            self.disk_size = total
+
+
+card_cache = CardCache()
+card_cache_total.set_function(lambda: {
+    ('hit',): card_cache.hits,
+    ('disk_hit',): card_cache.disk_hits,
+    ('miss',): card_cache.misses,
+})
@@ -10,6 +10,20 @@ DISCORD_TOKEN = os.getenv('DISCORD_TOKEN', '')
 # Bot Settings
 COMMAND_PREFIX = '!'
 BOT_DESCRIPTION = "Custom PNL Card Generator Bot"
+# Fingerprint of the last synced slash command tree, the sync is skipped while it matches
+COMMAND_TREE_HASH_FILE = os.getenv('COMMAND_TREE_HASH_FILE', '.command_tree_hash')
+COMMAND_SYNC = os.getenv('COMMAND_SYNC', '1') != '0'     # Only one shard process syncs commands
+
+# Sharding, set per process by the run_bot.py launcher
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 0))            # Total shards, 0 runs a single unsharded bot
+SHARD_IDS = [int(i) for i in os.getenv('SHARD_IDS', '').split(',') if i.strip()]  # Shards for this process, empty for all
+
+# Keep-alive / metrics server
+WEB_HOST = os.getenv('WEB_HOST', '0.0.0.0')
+WEB_PORT = int(os.getenv('WEB_PORT', 8080))
+RENDER_API_TOKEN = os.getenv('RENDER_API_TOKEN', '')            # Bearer token required by /render, empty turns /render off
+RENDER_API_MAX_BATCH = int(os.getenv('RENDER_API_MAX_BATCH', 50))  # Cards per POST /render batch
+BEHIND_LAUNCHER = os.getenv('BEHIND_LAUNCHER', '0') == '1'        # Set by launcher.py, trusts its X-Forwarded-For
 
 # Image Settings
 DEFAULT_CARD_WIDTH = 1188
@@ -36,4 +50,63 @@ FONTS = {
         'small': 24,                 # USD values and subtitles
         'large': 24                  # PROFIT/LOSS text
     }
-} 
\ No newline at end of file
+} 
+# Render Settings
+RENDER_EXECUTOR = os.getenv('RENDER_EXECUTOR', 'process')   # 'process' or 'thread'
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', os.cpu_count() or 1))
+RENDER_QUEUE_SIZE = int(os.getenv('RENDER_QUEUE_SIZE', 64))           # Renders waiting across all users
+RENDER_USER_CONCURRENCY = int(os.getenv('RENDER_USER_CONCURRENCY', 1))  # Renders running at once per user
+RENDER_USER_QUEUE = int(os.getenv('RENDER_USER_QUEUE', 2))            # Renders waiting per user
+RENDER_DEADLINE = float(os.getenv('RENDER_DEADLINE', 60))             # Seconds a render may wait before it is shed
+SHUTDOWN_REPLY_TIMEOUT = float(os.getenv('SHUTDOWN_REPLY_TIMEOUT', 15))  # Seconds shutdown waits for commands to send their cards
+ASSET_CACHE_DIR = os.getenv('ASSET_CACHE_DIR', '.asset_cache')        # Raw pixel files workers map, empty disables
+RENDER_MEMORY_STATS = os.getenv('RENDER_MEMORY_STATS', '0') == '1'   # Per-render peak memory, process workers only
+THEME_RELOAD_INTERVAL = float(os.getenv('THEME_RELOAD_INTERVAL', 2))  # Seconds between theme file checks, 0 disables
+
+# Price Settings
+PRICE_CACHE_TTL = float(os.getenv('PRICE_CACHE_TTL', 60))   # Seconds before a cached price is refreshed
+# Comma separated price sources, tried in order: CoinGecko-compatible URLs or file:<path> JSON snapshots
+PRICE_SOURCES = os.getenv('PRICE_SOURCES', 'https://api.coingecko.com/api/v3/simple/price')
+PRICE_TIMEOUT = float(os.getenv('PRICE_TIMEOUT', 5))             # Seconds before a source attempt is abandoned
+PRICE_HEDGE_DELAY = float(os.getenv('PRICE_HEDGE_DELAY', 0.5))   # Seconds before the next source is raced in
+PRICE_BREAKER_FAILURES = 3       # Consecutive failures before a source is skipped
+PRICE_BREAKER_RESET = 30.0       # Seconds before a tripped source is tried again
+
+# Rendered Card Cache
+CARD_CACHE_BYTES = int(os.getenv('CARD_CACHE_BYTES', 64 * 1024 * 1024))          # In-memory budget, 0 disables
+CARD_CACHE_DIR = os.getenv('CARD_CACHE_DIR', '')                                 # On-disk tier, empty disables
+CARD_CACHE_DISK_BYTES = int(os.getenv('CARD_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+
+# Output Encoding
+CARD_FORMAT = os.getenv('CARD_FORMAT', 'PNG')                             # PNG, WEBP or JPEG
+CARD_QUALITY = int(os.getenv('CARD_QUALITY', 90))                         # WEBP/JPEG quality (1-100)
+CARD_PNG_COMPRESS_LEVEL = int(os.getenv('CARD_PNG_COMPRESS_LEVEL', 1))    # 0-9, 1 encodes ~3x faster than 6 for ~18% more bytes
+CARD_WEBP_METHOD = int(os.getenv('CARD_WEBP_METHOD', 4))                  # 0-6, lower encodes faster
+# Per theme overrides of the settings above, e.g. {'toji': {'format': 'JPEG', 'quality': 85}}
+# An 'animation' entry overrides the animated card settings below, e.g. {'jjk': {'animation': {'format': 'WEBP'}}}
+THEME_OUTPUT = {}
+
+# Animated Cards
+CARD_ANIMATION_FORMAT = os.getenv('CARD_ANIMATION_FORMAT', 'GIF')        # GIF, PNG (APNG) or WEBP
+CARD_ANIMATION_FRAMES = int(os.getenv('CARD_ANIMATION_FRAMES', 30))
+CARD_ANIMATION_FRAME_MS = int(os.getenv('CARD_ANIMATION_FRAME_MS', 60))
+CARD_ANIMATION_HOLD_MS = 2000    # How long the final frame stays up before the loop restarts
+
+# Progressive Delivery
+CARD_PREVIEW = os.getenv('CARD_PREVIEW', '1') != '0'             # Send a quick draft first, then edit in the full card
+CARD_PREVIEW_MIN_WAIT = float(os.getenv('CARD_PREVIEW_MIN_WAIT', 0.5))  # Skip the draft when the card is expected sooner
+CARD_PREVIEW_SCALE = 2           # Draft is the card shrunk by this factor
+CARD_PREVIEW_QUALITY = 70        # Draft JPEG quality
+
+# User-uploaded Backgrounds
+BACKGROUND_UPLOAD_DIR = os.getenv('BACKGROUND_UPLOAD_DIR', os.path.join(BACKGROUNDS_FOLDER, 'uploads'))
+BACKGROUND_UPLOAD_MAX_BYTES = int(os.getenv('BACKGROUND_UPLOAD_MAX_BYTES', 8 * 1024 * 1024))   # Largest attachment accepted
+BACKGROUND_UPLOAD_MAX_PIXELS = int(os.getenv('BACKGROUND_UPLOAD_MAX_PIXELS', 40_000_000))      # Largest image accepted, width x height
+# Stored uploads plus the raw pixel files rendered from them, least recently used are deleted first
+BACKGROUND_UPLOAD_DISK_BYTES = int(os.getenv('BACKGROUND_UPLOAD_DISK_BYTES', 512 * 1024 * 1024))
+# Compiled upload themes and their layers kept in each process
+BACKGROUND_UPLOAD_MEMORY_BYTES = int(os.getenv('BACKGROUND_UPLOAD_MEMORY_BYTES', 64 * 1024 * 1024))
+
+# Portfolio Settings
+PORTFOLIO_MAX_TRADES = 50000
+PORTFOLIO_MAX_BYTES = 4 * 1024 * 1024    # Largest trade file attachment accepted
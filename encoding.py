@@ -0,0 +1,100 @@
+"""
+Output encoding for finished cards
+Format and quality are chosen globally in config.py or per theme, and every
+encode reports its size and time so deployments can trade bytes against CPU
+"""
+
+import io
+import time
+from typing import Dict, List, Tuple
+
+from PIL import Image
+
+import config
+
+# File extension for each supported output format
+EXTENSIONS = {'PNG': 'png', 'WEBP': 'webp', 'JPEG': 'jpg'}
+ANIMATION_EXTENSIONS = {'GIF': 'gif', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def output_settings(theme: str) -> Dict:
+    """Resolve the encoder settings for a theme"""
+    settings = {
+        'format': config.CARD_FORMAT,
+        'quality': config.CARD_QUALITY,
+        'compress_level': config.CARD_PNG_COMPRESS_LEVEL,
+        'webp_method': config.CARD_WEBP_METHOD,
+    }
+    settings.update(config.THEME_OUTPUT.get(theme, {}))
+
+    fmt = settings['format'].upper()
+    fmt = 'JPEG' if fmt == 'JPG' else fmt
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unsupported card format: {settings['format']}")
+    settings['format'] = fmt
+    return settings
+
+
+def animation_settings(theme: str) -> Dict:
+    """Resolve the animated encoder settings for a theme"""
+    settings = output_settings(theme)
+    settings.update({
+        'format': config.CARD_ANIMATION_FORMAT,
+        'frames': max(2, config.CARD_ANIMATION_FRAMES),
+        'frame_ms': config.CARD_ANIMATION_FRAME_MS,
+        'hold_ms': config.CARD_ANIMATION_HOLD_MS,
+    })
+    settings.update(config.THEME_OUTPUT.get(theme, {}).get('animation', {}))
+
+    fmt = settings['format'].upper()
+    fmt = 'PNG' if fmt == 'APNG' else fmt
+    if fmt not in ANIMATION_EXTENSIONS:
+        raise ValueError(f"Unsupported animation format: {settings['format']}")
+    settings['format'] = fmt
+    return settings
+
+
+def encode_image(img: Image.Image, settings: Dict) -> Tuple[io.BytesIO, Dict]:
+    """Encode a finished card, returning the bytes and {'format', 'bytes', 'seconds'}"""
+    fmt = settings['format']
+    output = io.BytesIO()
+    start = time.perf_counter()
+
+    if fmt == 'PNG':
+        img.save(output, format='PNG', compress_level=settings['compress_level'], optimize=False)
+    elif fmt == 'WEBP':
+        img.save(output, format='WEBP', quality=settings['quality'], method=settings['webp_method'])
+    else:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.save(output, format='JPEG', quality=settings['quality'], optimize=False)
+
+    info = {'format': fmt, 'bytes': output.tell(), 'seconds': time.perf_counter() - start}
+    output.seek(0)
+    return output, info
+
+
+def encode_animation(frames: List[Image.Image], durations: List[int], settings: Dict) -> Tuple[io.BytesIO, Dict]:
+    """Encode animation frames, returning the bytes and {'format', 'bytes', 'seconds', 'frames'}"""
+    fmt = settings['format']
+    output = io.BytesIO()
+    start = time.perf_counter()
+
+    if fmt == 'GIF':
+        # One palette from the final frame for every frame: no per-frame quantize cost,
+        # no palette flicker, and undithered pixels stay identical between frames.
+        # Fast octree builds it ~20x quicker than median cut for about the same colour error
+        palette = frames[-1].quantize(256, method=Image.Quantize.FASTOCTREE)
+        frames = [frame.quantize(palette=palette, dither=Image.Dither.NONE) for frame in frames]
+        frames[0].save(output, format='GIF', save_all=True, append_images=frames[1:],
+                       duration=durations, loop=0, optimize=False)
+    elif fmt == 'PNG':
+        frames[0].save(output, format='PNG', save_all=True, append_images=frames[1:], duration=durations,
+                       loop=0, compress_level=settings['compress_level'], optimize=False)
+    else:
+        frames[0].save(output, format='WEBP', save_all=True, append_images=frames[1:], duration=durations,
+                       loop=0, quality=settings['quality'], method=settings['webp_method'])
+
+    info = {'format': fmt, 'bytes': output.tell(), 'seconds': time.perf_counter() - start, 'frames': len(frames)}
+    output.seek(0)
+    return output, info
@@ -0,0 +1,177 @@
+"""
+Sharded deployment launcher
+Runs the bot as several shard processes, each with its own event loop, GIL
+and render workers, behind a single keep-alive and metrics server
+"""
+
+import asyncio
+import os
+import signal
+import sys
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+
+import config
+from metrics import Counter, Gauge, Registry, merge_expositions
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+RESTART_DELAY = 5.0     # Seconds before a crashed shard process is started again
+STOP_TIMEOUT = config.RENDER_DEADLINE + config.SHUTDOWN_REPLY_TIMEOUT + 10   # Seconds a shard process gets to drain before it is killed
+
+launcher_registry = Registry()
+shard_up = launcher_registry.register(Gauge(
+    'pnl_shard_process_up', 'Whether a shard process answered the last metrics scrape', ['shard']))
+shard_restarts_total = launcher_registry.register(Counter(
+    'pnl_shard_process_restarts_total', 'Shard processes restarted after exiting unexpectedly', ['shard']))
+
+
+def plan_shards(shard_count: int, processes: int) -> List[List[int]]:
+    """Spread shard ids across processes round-robin"""
+    return [list(range(i, shard_count, processes)) for i in range(processes)]
+
+
+class ShardProcess:
+    """One bot process running a subset of the shards, restarted if it dies"""
+
+    def __init__(self, index: int, shard_ids: List[int], shard_count: int, port: int, render_workers: int):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.port = port
+        self.env = dict(os.environ,
+                        SHARD_COUNT=str(shard_count),
+                        SHARD_IDS=','.join(map(str, shard_ids)),
+                        WEB_HOST='127.0.0.1',
+                        WEB_PORT=str(port),
+                        RENDER_WORKERS=str(render_workers),
+                        # Only the first process syncs slash commands
+                        COMMAND_SYNC='1' if index == 0 else '0',
+                        # Shards trust the X-Forwarded-For this launcher adds to /render
+                        BEHIND_LAUNCHER='1',
+                        PYTHONUNBUFFERED='1')
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.stopping = False
+
+    async def run(self):
+        """Run the process, restarting it until stop() is called"""
+        while not self.stopping:
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, BOT_SCRIPT, env=self.env,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                # Keep Ctrl+C away from the shards, the launcher stops them itself
+                start_new_session=True)
+            print(f"🧩 Shard process {self.index} started (pid {self.process.pid}, shards {self.shard_ids})")
+
+            async for line in self.process.stdout:
+                print(f"[shard {self.index}] {line.decode('utf-8', 'replace').rstrip()}")
+            code = await self.process.wait()
+
+            if self.stopping:
+                break
+            shard_restarts_total.inc(shard=self.index)
+            print(f"❌ Shard process {self.index} exited with code {code}, restarting in {RESTART_DELAY:.0f}s")
+            await asyncio.sleep(RESTART_DELAY)
+
+    async def stop(self):
+        """Ask the process to shut down cleanly, killing it if it doesn't"""
+        self.stopping = True
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(self.process.wait(), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"❌ Shard process {self.index} didn't stop in time, killing it")
+            self.process.kill()
+
+
+class Launcher:
+    """Starts the shard processes and serves keep-alive, combined metrics and the render API"""
+
+    def __init__(self, processes: int, shard_count: int, render_workers: Optional[int] = None):
+        workers = render_workers or max(1, (os.cpu_count() or 1) // processes)
+        self.shards = [
+            ShardProcess(i, shard_ids, shard_count, config.WEB_PORT + 1 + i, workers)
+            for i, shard_ids in enumerate(plan_shards(shard_count, processes))
+        ]
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._next_shard = 0
+
+    async def handle_ping(self, request):
+        return web.Response(text="Bot is alive!")
+
+    async def _scrape(self, shard: ShardProcess) -> Optional[str]:
+        try:
+            async with self._session.get(f'http://127.0.0.1:{shard.port}/metrics') as response:
+                text = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            shard_up.set(0, shard=shard.index)
+            return None
+        shard_up.set(1, shard=shard.index)
+        return text
+
+    async def handle_metrics(self, request):
+        scrapes = await asyncio.gather(*(self._scrape(shard) for shard in self.shards))
+        merged = merge_expositions({str(shard.index): text for shard, text in zip(self.shards, scrapes) if text},
+                                   'shard')
+        body = launcher_registry.render() + merged
+        return web.Response(body=body.encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def handle_render(self, request):
+        """Forward /render to the shard processes in turn, streaming the reply back"""
+        shard = self.shards[self._next_shard % len(self.shards)]
+        self._next_shard += 1
+        headers = {name: value for name, value in request.headers.items()
+                   if name.lower() in ('authorization', 'if-none-match', 'content-type')}
+        headers['X-Forwarded-For'] = request.remote or ''
+        try:
+            async with self._session.request(
+                    request.method, f'http://127.0.0.1:{shard.port}/render', params=request.query,
+                    data=await request.read() or None, headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=None, sock_connect=2)) as upstream:
+                response = web.StreamResponse(status=upstream.status, headers={
+                    name: value for name, value in upstream.headers.items()
+                    if name.lower() in ('content-type', 'content-length', 'etag', 'cache-control', 'retry-after')})
+                await response.prepare(request)
+                async for chunk in upstream.content.iter_chunked(64 * 1024):
+                    await response.write(chunk)
+                await response.write_eof()
+                return response
+        except aiohttp.ClientError:
+            return web.json_response({'error': f"shard process {shard.index} is unavailable"}, status=502)
+
+    async def run(self):
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2))
+        app = web.Application()
+        app.router.add_get('/', self.handle_ping)
+        app.router.add_get('/metrics', self.handle_metrics)
+        if config.RENDER_API_TOKEN:
+            app.router.add_route('*', '/render', self.handle_render)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, config.WEB_HOST, config.WEB_PORT).start()
+        print(f"🌐 Keep-alive server running on port {config.WEB_PORT}")
+
+        tasks = [asyncio.create_task(shard.run()) for shard in self.shards]
+        await stop.wait()
+
+        print("🛑 Stopping shard processes...")
+        await asyncio.gather(*(shard.stop() for shard in self.shards))
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._session.close()
+        await runner.cleanup()
+
+
+def main(processes: int, shard_count: Optional[int] = None, render_workers: Optional[int] = None):
+    """Run `processes` shard processes covering `shard_count` shards (one per process by default)"""
+    processes = max(1, processes)
+    shard_count = max(processes, shard_count or processes)
+    print(f"🧩 Launching {shard_count} shard(s) across {processes} process(es)")
+    asyncio.run(Launcher(processes, shard_count, render_workers).run())
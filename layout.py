@@ -0,0 +1,472 @@
+"""
+Declarative theme layouts
+A theme's layout is compiled once into flat static and dynamic draw plans,
+with fonts, colours and coordinates resolved ahead of time, so a render is a
+tight loop over precompiled operations
+
+Layout format (see THEMES in card.py):
+    'mode'        background mode, 'RGB' or 'RGBA'
+    'fallback'    'grid' or an RGBA colour used when the background can't load
+    'composite'   draw on a transparent overlay and alpha-composite it, instead
+                  of drawing straight onto the background
+    'scanlines'   row step of the scanline mask cut through dynamic text, or None
+    'text'        templates for every dynamic string, formatted with PNLCard.text_fields()
+    'animated'    text fields that count up in animated cards
+    'static'      ops drawn once into the cached static layer
+    'dynamic'     ops drawn for every card
+
+Ops are dicts with an 'op' of text, glow, rect, fade, line, brackets,
+scanlines or cursor. Colours are theme colour names, 'pnl' (profit or loss
+colour depending on the trade), or RGB(A) tuples. Coordinates may use the
+strings 'width' and 'height' for the card's edges.
+"""
+
+import functools
+import hashlib
+import string
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+from assets import background_cache, font_registry, layer_cache, private_copy, source_stamp
+
+
+@functools.lru_cache(maxsize=1024)
+def glow_box(text: str, font, radius: float,
+             offsets: Tuple[Tuple[int, int], ...] = ((0, 0),)) -> Tuple[int, int, int, int]:
+    """Extent of a text glow drawn at the origin, including room for the blur to spread"""
+    box = font.getbbox(text)
+    # Leave room for the blur to spread without clipping
+    pad = int(radius * 3) + 2
+    return (box[0] + min(dx for dx, _ in offsets) - pad, box[1] + min(dy for _, dy in offsets) - pad,
+            box[2] + max(dx for dx, _ in offsets) + pad, box[3] + max(dy for _, dy in offsets) + pad)
+
+
+@functools.lru_cache(maxsize=256)
+def glow_sprite(text: str, font, fill: tuple, radius: float,
+                offsets: Tuple[Tuple[int, int], ...] = ((0, 0),)) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Blurred glow for text drawn at the origin, and the sprite's offset from that origin"""
+    left, top, right, bottom = glow_box(text, font, radius, offsets)
+    sprite = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+    for dx, dy in offsets:
+        draw.text((dx - left, dy - top), text, font=font, fill=fill)
+    return sprite.filter(ImageFilter.GaussianBlur(radius)), (left, top)
+
+
+def draw_glow(layer: Image.Image, xy: Tuple[int, int], text: str, font, fill: tuple, radius: float,
+              offsets: Tuple[Tuple[int, int], ...] = ((0, 0),)):
+    """Composite a blurred text glow onto an RGBA layer, touching only the glow's region"""
+    sprite, (ox, oy) = glow_sprite(text, font, fill, radius, offsets)
+    x, y = xy[0] + ox, xy[1] + oy
+    layer.alpha_composite(sprite, dest=(max(0, x), max(0, y)), source=(max(0, -x), max(0, -y)))
+
+
+def grid_background(width: int, height: int) -> Image.Image:
+    """Create a cyberpunk-themed background"""
+    img = Image.new('RGB', (width, height), color=(15, 25, 35))
+    draw = ImageDraw.Draw(img)
+
+    grid_color = (25, 35, 45)
+    for x in range(0, width, 40):
+        draw.line([(x, 0), (x, height)], fill=grid_color, width=1)
+    for y in range(0, height, 40):
+        draw.line([(0, y), (width, y)], fill=grid_color, width=1)
+
+    accent_color = (0, 100, 120)
+    draw.rectangle([10, 10, width-10, height-10], outline=accent_color, width=2)
+
+    return img
+
+
+def layer_keys(theme: str, theme_config: Dict, size: Tuple[int, int]) -> Tuple[tuple, tuple]:
+    """Keys of the static and static RGB layers a theme's plan caches at a card size"""
+    version = hashlib.sha1(repr(theme_config).encode()).hexdigest()[:12]
+    return ('static', theme, size, version), ('static_rgb', theme, size, version)
+
+
+class DrawPlan:
+    """A theme layout compiled for one card size"""
+
+    def __init__(self, theme: str, theme_config: Dict, size: Tuple[int, int]):
+        layout = theme_config['layout']
+        self.theme = theme
+        self.size = size
+        self.mode = layout.get('mode', 'RGB')
+        self.background = theme_config['background']
+        self.fallback = layout.get('fallback', (0, 0, 0, 255))
+        self.composite = layout.get('composite', False)
+        self.scanlines = layout.get('scanlines')
+        self.text = dict(layout['text'])
+        # Text keys whose templates use a counting field change from frame to frame
+        counting = set(layout.get('animated', ()))
+        self.animated_keys = {key for key, template in self.text.items()
+                              if counting & {field for _, field, _, _ in string.Formatter().parse(template) if field}}
+        self.sources = [self.background] + [path for path, _ in theme_config['fonts'].values()]
+        # What the plan was compiled from, see is_current()
+        self.config = theme_config
+        self.stamp = source_stamp(self.sources)
+        # Cached layer keys carry a hash of the definition, stored layers outlive the process that drew them
+        self.static_key, self.static_rgb_key = layer_keys(theme, theme_config, size)
+        self.version = self.static_key[-1]
+
+        self._colors = theme_config['colors']
+        self._fonts = font_registry.theme_fonts(theme_config['fonts'])
+        self.static_ops = self._compile(layout.get('static', []))
+        self.dynamic_ops = self._compile(layout.get('dynamic', []))
+        self.dynamic_runs = self._stage_runs(self.dynamic_ops)
+        # Previews skip the glows, the slowest ops to draw
+        self.preview_ops = [op for op in self.dynamic_ops if op[0] != 'glow']
+
+    @staticmethod
+    def _stage_runs(ops: Sequence[tuple]) -> List[Tuple[str, List[tuple]]]:
+        """Consecutive ops grouped by the render stage they are timed under"""
+        runs: List[Tuple[str, List[tuple]]] = []
+        for op in ops:
+            stage = 'glow' if op[0] == 'glow' else 'draw'
+            if runs and runs[-1][0] == stage:
+                runs[-1][1].append(op)
+            else:
+                runs.append((stage, [op]))
+        return runs
+
+    # Compilation
+
+    def _resolve(self, value):
+        """Replace 'width'/'height' with the card's edges"""
+        if value == 'width':
+            return self.size[0]
+        if value == 'height':
+            return self.size[1]
+        if isinstance(value, (tuple, list)):
+            return tuple(self._resolve(v) for v in value)
+        return value
+
+    def _fills(self, color, alpha: Optional[int] = None) -> Tuple[tuple, tuple]:
+        """(profit fill, loss fill) for a colour spec"""
+        if color == 'pnl':
+            fills = (self._colors['profit'], self._colors['loss'])
+        elif isinstance(color, str):
+            fills = (self._colors[color],) * 2
+        else:
+            fills = (tuple(color),) * 2
+        if alpha is not None:
+            fills = tuple((*fill[:3], alpha) for fill in fills)
+        return fills
+
+    def _compile(self, specs: Sequence[Dict]) -> List[tuple]:
+        ops = []
+        for spec in specs:
+            kind = spec['op']
+            if kind == 'text':
+                xy = self._resolve(spec['xy'])
+                font = self._fonts[spec['font']]
+                fills = self._fills(spec['color'], spec.get('alpha'))
+                # Keys of layout['text'] are filled per card, anything else is literal
+                key = spec['text'] if spec['text'] in self.text else None
+                ops.append(('text', xy, key, spec['text'], font, fills))
+            elif kind == 'glow':
+                spread = spec.get('spread', 0)
+                offsets = tuple(pos for offset in range(spread, 0, -2)
+                                for pos in ((-offset, -offset), (offset, offset))) or ((0, 0),)
+                ops.append(('glow', self._resolve(spec['xy']), spec['text'], self._fonts[spec['font']],
+                            self._fills(spec['color'], spec.get('alpha')), spec['radius'], offsets))
+            elif kind == 'rect':
+                ops.append(('rect', self._resolve(spec['box']), self._fills(spec['color'], spec.get('alpha'))))
+            elif kind == 'line':
+                ops.append(('line', self._resolve(spec['points']), self._fills(spec['color'], spec.get('alpha')),
+                            spec.get('width', 1)))
+            elif kind == 'fade':
+                # Horizontal fade from the colour's alpha down to transparent
+                x0, x1 = self._resolve(spec['x'])
+                color = tuple(spec['color'][:3])
+                for i in range(x0, x1):
+                    alpha = int(spec['alpha'] * (1 - (i - x0) / (x1 - x0)))
+                    ops.append(('line', ((i, 0), (i, self.size[1])), ((*color, alpha),) * 2, 1))
+            elif kind == 'scanlines':
+                fills = self._fills(spec['color'])
+                for y in range(0, self.size[1], spec['step']):
+                    ops.append(('line', ((0, y), (self.size[0], y)), fills, 1))
+            elif kind == 'brackets':
+                ops.extend(self._compile_brackets(spec))
+            elif kind == 'cursor':
+                x, y0, y1 = spec['x'], spec['y'][0], spec['y'][1]
+                ops.append(('cursor', spec['after'], x, self._fonts[spec['font']], y0, y1,
+                            spec['width'], spec.get('gap', 0), self._fills(spec['color'])))
+            else:
+                raise ValueError(f"Unknown layout op '{kind}' in theme {self.theme}")
+        return ops
+
+    def _compile_brackets(self, spec: Dict) -> List[tuple]:
+        """Corner brackets inset from each edge of the card"""
+        width, height = self.size
+        inset, size, line_width = spec['inset'], spec['size'], spec.get('width', 1)
+        fills = self._fills(spec['color'], spec.get('alpha'))
+        left, top, right, bottom = inset, inset, width - inset, height - inset
+        segments = [
+            ((left, top), (left + size, top)), ((left, top), (left, top + size)),
+            ((right, top), (right - size, top)), ((right, top), (right, top + size)),
+            ((left, bottom), (left + size, bottom)), ((left, bottom), (left, bottom - size)),
+            ((right, bottom), (right - size, bottom)), ((right, bottom), (right, bottom - size)),
+        ]
+        return [('line', points, fills, line_width) for points in segments]
+
+    # Rendering
+
+    @staticmethod
+    def _draw_ops(img: Image.Image, ops: Sequence[tuple], text: Dict[str, str], fill_index: int,
+                  origin: Tuple[int, int] = (0, 0), glow_scale: float = 1.0, cursor_visible: bool = True):
+        """Draw ops onto img, with `origin` the card position of img's top-left corner"""
+        draw = ImageDraw.Draw(img)
+        ox, oy = origin
+        for op in ops:
+            kind = op[0]
+            if kind == 'text':
+                _, (x, y), key, literal, font, fills = op
+                draw.text((x - ox, y - oy), text[key] if key else literal, font=font, fill=fills[fill_index])
+            elif kind == 'glow':
+                _, (x, y), key, font, fills, radius, offsets = op
+                fill = fills[fill_index]
+                if glow_scale != 1.0:
+                    fill = (*fill[:3], int(fill[3] * glow_scale))
+                draw_glow(img, (x - ox, y - oy), text[key], font, fill, radius, offsets)
+            elif kind == 'line':
+                draw.line([(x - ox, y - oy) for x, y in op[1]], fill=op[2][fill_index], width=op[3])
+            elif kind == 'rect':
+                x0, y0, x1, y1 = op[1]
+                draw.rectangle([x0 - ox, y0 - oy, x1 - ox, y1 - oy], fill=op[2][fill_index])
+            elif kind == 'cursor' and cursor_visible:
+                _, key, x, font, y0, y1, width, gap, fills = op
+                cursor_x = int(x + font.getlength(text[key]) + gap) - ox
+                draw.rectangle([cursor_x, y0 - oy, cursor_x + width, y1 - oy], fill=fills[fill_index])
+
+    def _is_animated(self, op: tuple) -> bool:
+        """Whether an op can look different between frames of an animated card"""
+        if op[0] == 'text':
+            return op[2] in self.animated_keys
+        return op[0] in ('glow', 'cursor')
+
+    @staticmethod
+    def _op_box(op: tuple, text: Dict[str, str]) -> Tuple[int, int, int, int]:
+        """Card region an op draws into"""
+        kind = op[0]
+        if kind == 'text':
+            _, (x, y), key, literal, font, _ = op
+            left, top, right, bottom = font.getbbox(text[key] if key else literal)
+        elif kind == 'glow':
+            _, (x, y), key, font, _, radius, offsets = op
+            left, top, right, bottom = glow_box(text[key], font, radius, offsets)
+        elif kind == 'cursor':
+            _, key, x, font, y0, y1, width, gap, _ = op
+            cursor_x = int(x + font.getlength(text[key]) + gap)
+            return cursor_x, y0, cursor_x + width + 1, y1 + 1
+        elif kind == 'rect':
+            x0, y0, x1, y1 = op[1]
+            return x0, y0, x1 + 1, y1 + 1
+        else:
+            xs, ys, half = [x for x, _ in op[1]], [y for _, y in op[1]], op[3] // 2 + 1
+            return min(xs) - half, min(ys) - half, max(xs) + half + 1, max(ys) + half + 1
+        return x + left, y + top, x + right, y + bottom
+
+    @classmethod
+    def _op_extents(cls, op: tuple, texts: Sequence[Dict[str, str]]) -> List[Tuple[int, int, int, int]]:
+        """Distinct regions an op draws into across texts, measuring each string it draws once"""
+        key = op[1] if op[0] == 'cursor' else op[2] if op[0] in ('text', 'glow') else None
+        boxes = {}
+        for text in texts:
+            value = text[key] if key else None
+            if value not in boxes:
+                boxes[value] = cls._op_box(op, text)
+        return list(boxes.values())
+
+    def build_static(self) -> Image.Image:
+        """Background with every static op drawn on it"""
+        bg_img = background_cache.get(self.background, self.mode, self.size)
+        if bg_img is None:
+            if self.fallback == 'grid':
+                bg_img = grid_background(*self.size).convert(self.mode)
+            else:
+                bg_img = Image.new(self.mode, self.size, tuple(self.fallback))
+
+        if not self.composite:
+            self._draw_ops(bg_img, self.static_ops, {}, 0)
+            return bg_img
+
+        overlay = Image.new('RGBA', self.size, (0, 0, 0, 0))
+        self._draw_ops(overlay, self.static_ops, {}, 0)
+        return Image.alpha_composite(bg_img, overlay)
+
+    def is_current(self, theme_config: Dict) -> bool:
+        """Whether the plan still matches the theme definition and its font and background files"""
+        return (self.config is theme_config or self.config == theme_config) and source_stamp(self.sources) == self.stamp
+
+    def warm(self):
+        """Build every cached layer the plan renders from"""
+        self._static_shared()
+        if self.composite:
+            self._static_rgb()
+            if self.scanlines:
+                self.scanline_mask()
+
+    def static_layer(self) -> Image.Image:
+        """Private copy of the cached static layer"""
+        return private_copy(self._static_shared())
+
+    def _static_shared(self) -> Image.Image:
+        return layer_cache.get_shared(self.static_key, self.sources, self.build_static)
+
+    def _static_rgb(self) -> Image.Image:
+        """Shared RGB version of a composited layout's static layer, so renders never convert a full frame"""
+        static = self._static_shared()   # fetched first, the cache lock isn't re-entrant
+        return layer_cache.get_shared(self.static_rgb_key, self.sources, lambda: static.convert('RGB'))
+
+    def scanline_mask(self) -> Image.Image:
+        """Alpha mask that clears every scanline row"""
+        width, height = self.size
+
+        def build():
+            mask = Image.new('L', self.size, 255)
+            draw = ImageDraw.Draw(mask)
+            for y in range(0, height, self.scanlines):
+                draw.line([(0, y), (width, y)], fill=0)
+            return mask
+        return layer_cache.get_shared(('scanlines', self.scanlines, self.size), (), build)
+
+    def _regions(self, dirty: Sequence[tuple], texts: Sequence[Dict[str, str]],
+                 ops: Optional[Sequence[tuple]] = None) -> List[Tuple[tuple, List[tuple]]]:
+        """Non-overlapping card regions covering the dirty ops, each with the ops that draw into it
+
+        A region covers each dirty op's extent for every text, and lists every
+        op (all dynamic ops by default) touching it in plan order, so redrawing
+        the region from the static layer reproduces the full render exactly
+        """
+        width, height = self.size
+        ops = self.dynamic_ops if ops is None else ops
+        extents = {id(op): self._op_extents(op, texts) for op in ops}
+        boxes = []
+        for op in dirty:
+            op_boxes = extents[id(op)]
+            boxes.append([min(b[0] for b in op_boxes) - 1, min(b[1] for b in op_boxes) - 1,
+                          max(b[2] for b in op_boxes) + 1, max(b[3] for b in op_boxes) + 1])
+
+        def overlaps(a, b):
+            return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+        # Merge overlapping boxes until none overlap
+        merged = []
+        for box in boxes:
+            while True:
+                hit = next((other for other in merged if overlaps(box, other)), None)
+                if hit is None:
+                    break
+                merged.remove(hit)
+                box = [min(box[0], hit[0]), min(box[1], hit[1]), max(box[2], hit[2]), max(box[3], hit[3])]
+            merged.append(box)
+
+        regions = []
+        for box in merged:
+            box = (max(0, box[0]), max(0, box[1]), min(width, box[2]), min(height, box[3]))
+            if box[0] < box[2] and box[1] < box[3]:
+                regions.append((box, [op for op in ops if any(overlaps(box, b) for b in extents[id(op)])]))
+        return regions
+
+    def _clips(self, regions: Sequence[Tuple[tuple, List[tuple]]]) -> List[tuple]:
+        """(box, static layer crop, scanline mask crop, stage runs) for each region"""
+        static = self._static_shared()
+        scanlines = self.scanline_mask() if self.composite and self.scanlines else None
+        return [(box, private_copy(static, box), scanlines.crop(box) if scanlines else None, self._stage_runs(ops))
+                for box, ops in regions]
+
+    def _draw_clip(self, frame: Image.Image, clip: tuple, text: Dict[str, str], fill_index: int, stage: Callable,
+                   glow_scale: float = 1.0, cursor_visible: bool = True):
+        """Redraw one region of a frame from the static layer"""
+        box, region_base, mask, runs = clip
+        if self.composite:
+            with stage('draw'):
+                target = Image.new('RGBA', region_base.size, (0, 0, 0, 0))
+        else:
+            target = region_base.copy()
+        for name, ops in runs:
+            with stage(name):
+                self._draw_ops(target, ops, text, fill_index, box[:2], glow_scale, cursor_visible)
+        if self.composite:
+            with stage('composite'):
+                if mask is not None:
+                    # Scanlines cut through the text the same way they cut through the static layer
+                    target.putalpha(ImageChops.multiply(target.getchannel('A'), mask))
+                composited = region_base.copy()
+                composited.alpha_composite(target)
+                target = composited
+        # Pasting drops the alpha channel, the static layer is opaque
+        frame.paste(target, box[:2])
+
+    def render(self, text: Dict[str, str], is_profit: bool, stage: Callable, glow: bool = True) -> Image.Image:
+        """Draw one card's dynamic ops over the static layer
+
+        `stage` is a context manager factory timing each render stage by name.
+        The only full-frame buffer allocated is the returned RGB image: layouts
+        that composite only composite the regions their ops cover.
+        """
+        fill_index = 0 if is_profit else 1
+        ops = self.dynamic_ops if glow else self.preview_ops
+        if not self.composite:
+            with stage('background'):
+                bg_img = self.static_layer()
+            for name, run in (self.dynamic_runs if glow else self._stage_runs(ops)):
+                with stage(name):
+                    self._draw_ops(bg_img, run, text, fill_index)
+            return bg_img
+
+        with stage('background'):
+            result = private_copy(self._static_rgb())
+            clips = self._clips(self._regions(ops, [text], ops))
+        for clip in clips:
+            self._draw_clip(result, clip, text, fill_index, stage)
+        return result
+
+    def render_frames(self, frames: Sequence[Tuple[Dict[str, str], float, bool]], is_profit: bool,
+                      stage: Callable) -> List[Image.Image]:
+        """Render an animated card, one (text, glow scale, cursor visible) tuple per frame
+
+        The first frame's card is rendered once as a base, and each frame only
+        redraws the regions the animated ops cover
+        """
+        fill_index = 0 if is_profit else 1
+        base = self.render(frames[0][0], is_profit, stage)
+        with stage('background'):
+            animated = [op for op in self.dynamic_ops if self._is_animated(op)]
+            clips = self._clips(self._regions(animated, [text for text, _, _ in frames]))
+
+        images = []
+        for text, glow_scale, cursor_visible in frames:
+            frame = base.copy()
+            for clip in clips:
+                self._draw_clip(frame, clip, text, fill_index, stage, glow_scale, cursor_visible)
+            images.append(frame)
+        return images
+
+
+_plans: Dict[Tuple[str, Tuple[int, int]], DrawPlan] = {}
+
+
+def compiled_plan(theme: str, theme_config: Dict, size: Tuple[int, int]) -> DrawPlan:
+    """The theme's draw plan for a card size, recompiled when the theme or its files change"""
+    plan = _plans.get((theme, size))
+    if plan is None or not plan.is_current(theme_config):
+        plan = _plans[(theme, size)] = DrawPlan(theme, theme_config, size)
+    return plan
+
+
+def install_plan(plan: DrawPlan) -> Optional[DrawPlan]:
+    """Swap in a plan compiled ahead of time and return the one it replaced
+
+    Renders already holding the old plan finish with it
+    """
+    replaced = _plans.get((plan.theme, plan.size))
+    _plans[(plan.theme, plan.size)] = plan
+    return replaced
+
+
+def clear_plans():
+    """Drop every compiled plan so the next render recompiles from THEMES"""
+    _plans.clear()
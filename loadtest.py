@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the /pnl command
+Drives the real slash_pnl callback with simulated Discord interactions at
+increasing concurrency, with prices served by a local CoinGecko stand-in,
+and reports throughput, end-to-end latency, event-loop lag and error rates
+for each stage
+
+Each stage runs N virtual users for a fixed time, every user invoking /pnl
+again as soon as its previous card arrives (after --think-ms), or after
+--retry-ms when it got a busy or error reply. Render workers and scheduler
+limits come from config.py as usual (RENDER_WORKERS, RENDER_QUEUE_SIZE, ...).
+
+Usage:
+    python loadtest.py --stages 10,50,100,200 --duration 20
+    python loadtest.py --stages 200 --api-latency-ms 80 --output loadtest_results.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Add the current directory to Python path so we can import our modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp import web
+from discord import app_commands
+
+import bot
+import config
+from benchmark import git_revision, percentile
+from card import THEMES
+from prices import SUPPORTED_CHAINS, CoinGeckoSource, close_session, price_cache, price_provider
+from render_pool import render_pool
+
+ACK_DEADLINE = 3.0   # Seconds Discord allows before an interaction must be acknowledged
+
+
+class PriceServer:
+    """Local stand-in for CoinGecko's /simple/price"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ''
+
+    async def handle_price(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        ids = request.query.get('ids', '').split(',')
+        prices = {info['id']: info['fallback_price'] * random.uniform(0.98, 1.02)
+                  for info in SUPPORTED_CHAINS.values()}
+        return web.json_response({token_id: {'usd': prices[token_id]} for token_id in ids if token_id in prices})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/api/v3/simple/price', self.handle_price)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}/api/v3/simple/price'
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class Invocation:
+    """Timeline of one simulated /pnl, in seconds since it started"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.acked: Optional[float] = None
+        # (seconds, 'send' or 'edit', content, file bytes)
+        self.messages: List[tuple] = []
+        self.exception: Optional[str] = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    @property
+    def finished(self) -> Optional[float]:
+        return self.messages[-1][0] if self.messages else None
+
+    @property
+    def first_image(self) -> Optional[float]:
+        """When the user first saw a card, a draft preview or the full one"""
+        return next((seconds for seconds, _, _, size in self.messages if size), None)
+
+    @property
+    def outcome(self) -> str:
+        """ok, busy, error, exception or no_reply"""
+        if self.exception is not None:
+            return 'exception'
+        if not self.messages:
+            return 'no_reply'
+        content = self.messages[-1][2] or ''
+        if content == bot.BUSY_MESSAGE:
+            return 'busy'
+        if content.startswith('❌'):
+            return 'error'
+        return 'ok'
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    """Followup message that records edits"""
+
+    def __init__(self, record: Invocation, api_latency: float):
+        self._record = record
+        self._api_latency = api_latency
+
+    async def edit(self, *, content=None, attachments=None, embed=None, **kwargs):
+        await asyncio.sleep(self._api_latency)
+        size = sum(_file_size(f) for f in attachments or ())
+        self._record.messages.append((self._record.elapsed(), 'edit', content, size))
+        return self
+
+
+class FakeResponse:
+    def __init__(self, record: Invocation, api_latency: float):
+        self._record = record
+        self._api_latency = api_latency
+
+    def is_done(self) -> bool:
+        return self._record.acked is not None
+
+    async def defer(self, *, ephemeral: bool = False, thinking: bool = False):
+        await asyncio.sleep(self._api_latency)
+        self._record.acked = self._record.elapsed()
+
+    async def send_message(self, content=None, **kwargs):
+        await asyncio.sleep(self._api_latency)
+        self._record.acked = self._record.elapsed()
+        self._record.messages.append((self._record.acked, 'send', content, _file_size(kwargs.get('file'))))
+
+
+class FakeFollowup:
+    def __init__(self, record: Invocation, api_latency: float):
+        self._record = record
+        self._api_latency = api_latency
+
+    async def send(self, content=None, *, file=None, files=None, wait: bool = False, **kwargs) -> FakeMessage:
+        # Uploads take twice as long as plain messages
+        size = _file_size(file) + sum(_file_size(f) for f in files or ())
+        await asyncio.sleep(self._api_latency * (2 if size else 1))
+        self._record.messages.append((self._record.elapsed(), 'send', content, size))
+        return FakeMessage(self._record, self._api_latency)
+
+
+class FakeInteraction:
+    """Just enough of discord.Interaction for the slash command callbacks"""
+
+    def __init__(self, user_id: int, api_latency: float = 0.0):
+        self.record = Invocation()
+        self.user = FakeUser(user_id)
+        self.response = FakeResponse(self.record, api_latency)
+        self.followup = FakeFollowup(self.record, api_latency)
+
+
+def _file_size(file) -> int:
+    if file is None:
+        return 0
+    size = file.fp.getbuffer().nbytes
+    file.close()
+    return size
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes a short periodic timer"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class TradeFactory:
+    """Distinct trades so the card cache can't hide render work"""
+
+    def __init__(self, themes: List[str], animated_ratio: float):
+        self._counter = itertools.count()
+        self.themes = themes
+        self.animated_ratio = animated_ratio
+        self.chains = list(SUPPORTED_CHAINS)
+
+    def next(self) -> Dict:
+        i = next(self._counter)
+        bought = 1.0 + (i % 997) / 10
+        chain, theme = self.chains[i % len(self.chains)], self.themes[i % len(self.themes)]
+        return {
+            'username': f'LoadUser{i}',
+            'coin_name': f'COIN{i % 50}',
+            'bought_amount': bought,
+            'sold_amount': bought * (0.3 + (i % 11) * 0.25),
+            'chain': app_commands.Choice(name=chain, value=chain),
+            'theme': app_commands.Choice(name=theme, value=theme),
+            'animated': random.random() < self.animated_ratio,
+        }
+
+
+async def invoke_pnl(user_id: int, trade: Dict, api_latency: float) -> Invocation:
+    """Run the real /pnl callback once with a simulated interaction"""
+    interaction = FakeInteraction(user_id, api_latency)
+    try:
+        await bot.slash_pnl.callback(interaction, **trade)
+    except Exception as e:
+        interaction.record.exception = f"{type(e).__name__}: {e}"
+    return interaction.record
+
+
+async def virtual_user(user_id: int, stop_at: float, trades: TradeFactory, api_latency: float, think: float,
+                       retry: float, results: List[Invocation]):
+    while time.perf_counter() < stop_at:
+        record = await invoke_pnl(user_id, trades.next(), api_latency)
+        results.append(record)
+        # People wait a moment before trying again after a busy or error reply
+        pause = think if record.outcome == 'ok' else max(think, retry)
+        if pause:
+            await asyncio.sleep(pause)
+
+
+def summarize_ms(samples: List[float]) -> Dict[str, float]:
+    return {
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000 if samples else 0.0,
+    }
+
+
+async def run_stage(concurrency: int, duration: float, trades: TradeFactory, args, server: PriceServer) -> Dict:
+    """Run `concurrency` virtual users for `duration` seconds and summarize what they saw"""
+    results: List[Invocation] = []
+    monitor = LoopLagMonitor()
+    price_requests = server.requests
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        virtual_user(user_id, start + duration, trades, args.api_latency_ms / 1000, args.think_ms / 1000,
+                     args.retry_ms / 1000, results)
+        for user_id in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+
+    outcomes = {}
+    for record in results:
+        outcomes[record.outcome] = outcomes.get(record.outcome, 0) + 1
+    ok = [record for record in results if record.outcome == 'ok']
+    acks = [record.acked for record in results if record.acked is not None]
+    exceptions = sorted({record.exception for record in results if record.exception})
+    return {
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'invocations': len(results),
+        'cards_per_sec': len(ok) / elapsed if elapsed else 0.0,
+        'end_to_end': summarize_ms([record.finished for record in ok]),
+        'first_image': summarize_ms([record.first_image for record in ok if record.first_image is not None]),
+        'ack': summarize_ms(acks),
+        'late_acks': sum(1 for ack in acks if ack > ACK_DEADLINE),
+        'loop_lag': summarize_ms(monitor.samples),
+        'outcomes': outcomes,
+        'error_rate': 1 - len(ok) / len(results) if results else 0.0,
+        'price_requests': server.requests - price_requests,
+        'exceptions': exceptions[:5],
+    }
+
+
+async def main_async(args) -> List[Dict]:
+    server = PriceServer(args.price_latency_ms / 1000)
+    await server.start()
+    price_provider.use_sources([CoinGeckoSource(server.url)])
+    price_cache.clear()
+    print(f"💰 CoinGecko stand-in on {server.url}")
+
+    await asyncio.to_thread(render_pool.start)
+    trades = TradeFactory(args.themes, args.animated_ratio)
+    stages = []
+    try:
+        for concurrency in args.stages:
+            result = await run_stage(concurrency, args.duration, trades, args, server)
+            stages.append(result)
+            e2e, lag = result['end_to_end'], result['loop_lag']
+            print(f"👥 {concurrency:>4} users  {result['cards_per_sec']:6.1f} cards/s  "
+                  f"e2e p50 {e2e['p50_ms']:7.0f}ms p99 {e2e['p99_ms']:7.0f}ms  "
+                  f"first image p50 {result['first_image']['p50_ms']:7.0f}ms  "
+                  f"ack p99 {result['ack']['p99_ms']:5.0f}ms  loop lag p99 {lag['p99_ms']:5.1f}ms "
+                  f"max {lag['max_ms']:5.1f}ms  errors {result['error_rate'] * 100:5.1f}%")
+            if result['outcomes'].keys() - {'ok'}:
+                print(f"     outcomes {result['outcomes']}")
+            for exception in result['exceptions']:
+                print(f"     ❌ {exception}")
+    finally:
+        await bot.render_scheduler.drain(timeout=config.RENDER_DEADLINE)
+        render_pool.shutdown()
+        await close_session()
+        await server.stop()
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test /pnl with simulated interactions')
+    parser.add_argument('--stages', default='10,50,100,200',
+                        type=lambda value: [int(v) for v in value.split(',') if v.strip()],
+                        help='comma separated concurrency levels to ramp through')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds per stage')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='pause between a user\'s invocations')
+    parser.add_argument('--retry-ms', type=float, default=1000.0, help='pause before retrying after a failed invocation')
+    parser.add_argument('--api-latency-ms', type=float, default=0.0,
+                        help='simulated Discord API latency per defer/send (uploads take twice as long)')
+    parser.add_argument('--price-latency-ms', type=float, default=50.0, help='price stand-in response time')
+    parser.add_argument('--themes', nargs='+', default=list(THEMES), choices=list(THEMES))
+    parser.add_argument('--animated-ratio', type=float, default=0.0, help='share of invocations asking for animation')
+    parser.add_argument('--output', default='loadtest_results.json', help='where to write JSON results')
+    args = parser.parse_args()
+    args.output = os.path.abspath(args.output)
+
+    # Theme assets are referenced relative to the project root
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    print(f"🚦 Load testing /pnl at {args.stages} concurrent users, {args.duration:.0f}s per stage "
+          f"({config.RENDER_WORKERS} {config.RENDER_EXECUTOR} render worker(s))")
+    print("=" * 60)
+    stages = asyncio.run(main_async(args))
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'render_workers': config.RENDER_WORKERS,
+            'render_executor': config.RENDER_EXECUTOR,
+            'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        },
+        'stages': stages,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Per-render peak memory measurement
+Pillow allocates pixel buffers outside Python's allocator, so tracemalloc only
+sees the Python side of a render. The resident-set high-water mark from /proc
+is reset before each render to catch the pixel buffers as well.
+"""
+
+import contextlib
+import re
+import tracemalloc
+from typing import Dict, Optional
+
+from PIL import Image
+
+STATUS_FILE = '/proc/self/status'
+CLEAR_REFS_FILE = '/proc/self/clear_refs'
+
+
+def _status_kb(*fields: str) -> Optional[Dict[str, int]]:
+    try:
+        with open(STATUS_FILE, 'r') as f:
+            status = f.read()
+    except OSError:
+        return None
+    values = {}
+    for field in fields:
+        match = re.search(rf'^{field}:\s+(\d+) kB', status, re.MULTILINE)
+        if match is None:
+            return None
+        values[field] = int(match.group(1))
+    return values
+
+
+def _reset_peak_rss() -> bool:
+    """Reset VmHWM to the current RSS, returns False where the kernel doesn't allow it"""
+    try:
+        with open(CLEAR_REFS_FILE, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _image_allocations() -> int:
+    return Image.core.get_stats()['new_count']
+
+
+@contextlib.contextmanager
+def measure(stats: Dict):
+    """Fill `stats` with the peak memory used inside the block
+
+    - peak_rss_kb: resident-set growth above the starting RSS, None without /proc.
+      Process-wide, so only exact when one render runs per process at a time
+    - tracemalloc_peak_kb: Python allocation peak, None unless tracemalloc is tracing
+    - images: Pillow images created
+    """
+    start = _status_kb('VmRSS') if _reset_peak_rss() else None
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        traced_start, _ = tracemalloc.get_traced_memory()
+    images_start = _image_allocations()
+    try:
+        yield stats
+    finally:
+        end = _status_kb('VmHWM') if start is not None else None
+        stats['peak_rss_kb'] = max(0, end['VmHWM'] - start['VmRSS']) if end is not None else None
+        stats['tracemalloc_peak_kb'] = (
+            (tracemalloc.get_traced_memory()[1] - traced_start) // 1024 if tracing else None)
+        stats['images'] = _image_allocations() - images_start
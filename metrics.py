@@ -0,0 +1,252 @@
+"""
+In-process metrics served in Prometheus text format on /metrics
+Counters, gauges and histograms are plain Python objects, cheap enough to
+update on every command
+"""
+
+import asyncio
+import contextlib
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from gateway round trips up to slow uploads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base for a named metric with optional labels"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def set_function(self, function: Callable[[], object]):
+        """Read the value at scrape time instead of tracking it
+
+        The function returns a number, or a dict of label-value tuples to numbers
+        """
+        self._function = function
+
+    def _function_values(self) -> Dict[Tuple[str, ...], float]:
+        value = self._function()
+        return value if isinstance(value, dict) else {(): value}
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        values = self._function_values() if self._function else dict(self._values)
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                for key, value in sorted(values.items())]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+            labels = _format_labels(self.label_names, key, ('le', '+Inf'))
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {count}')
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+def merge_expositions(expositions: Dict[str, str], label: str) -> str:
+    """Combine scrapes from several processes into one, labelling each sample with where it came from"""
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for source, text in expositions.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# HELP ') or line.startswith('# TYPE '):
+                family = line.split(' ', 3)[2]
+                if line not in headers.setdefault(family, []):
+                    headers[family].append(line)
+                continue
+            if not line.strip() or line.startswith('#'):
+                continue
+            name_end = min(i for i in (line.find('{'), line.find(' ')) if i >= 0)
+            name, rest = line[:name_end], line[name_end:]
+            extra = f'{label}="{_escape(source)}"'
+            if rest.startswith('{}'):
+                rest = '{' + extra + rest[1:]
+            elif rest.startswith('{'):
+                rest = '{' + extra + ',' + rest[1:]
+            else:
+                rest = '{' + extra + '}' + rest
+            headers.setdefault(family or name, [])
+            samples.setdefault(family or name, []).append(name + rest)
+
+    lines = []
+    for family, family_headers in headers.items():
+        lines.extend(family_headers)
+        lines.extend(samples.get(family, []))
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# /pnl phases: defer, background, price, preview, render, encode, upload
+phase_seconds = registry.register(Histogram(
+    'pnl_phase_seconds', 'Time spent in each phase of a /pnl command', ['phase']))
+command_errors_total = registry.register(Counter(
+    'pnl_command_errors_total', 'Slash commands that ended in an error reply', ['command', 'kind']))
+price_fallbacks_total = registry.register(Counter(
+    'pnl_price_fallbacks_total', 'Price lookups answered with the hard-coded fallback price', ['chain']))
+price_cache_total = registry.register(Counter(
+    'pnl_price_cache_total', 'Price cache lookups by result (fresh, stale, miss)', ['result']))
+card_cache_total = registry.register(Counter(
+    'pnl_card_cache_total', 'Rendered card cache lookups by result (hit, disk_hit, miss)', ['result']))
+card_encodes_total = registry.register(Counter(
+    'pnl_card_encodes_total', 'Cards encoded by the render pool by output format', ['format']))
+card_encoded_bytes_total = registry.register(Counter(
+    'pnl_card_encoded_bytes_total', 'Bytes of encoded card output by format', ['format']))
+card_encode_seconds_total = registry.register(Counter(
+    'pnl_card_encode_seconds_total', 'Seconds spent encoding cards by output format', ['format']))
+render_queue_depth = registry.register(Gauge(
+    'pnl_render_queue_depth', 'Renders waiting in the scheduler queue for a free worker'))
+renders_shed_total = registry.register(Counter(
+    'pnl_renders_shed_total', 'Renders refused with a busy reply (queue_full, user_limit, deadline, shutdown)',
+    ['reason']))
+renders_in_flight = registry.register(Gauge(
+    'pnl_renders_in_flight', 'Renders submitted to the pool and not yet finished'))
+render_peak_rss_bytes = registry.register(Histogram(
+    'pnl_render_peak_rss_bytes', 'Resident memory a render worker grew by while rendering one card', ['kind'],
+    buckets=(1 << 20, 2 << 20, 4 << 20, 8 << 20, 16 << 20, 32 << 20, 64 << 20, 128 << 20, 256 << 20)))
+theme_reloads_total = registry.register(Counter(
+    'pnl_theme_reloads_total', 'Theme hot reloads by result (reloaded, failed)', ['result']))
+background_uploads_total = registry.register(Counter(
+    'pnl_background_uploads_total', 'Uploaded /pnl backgrounds by result (stored, reused, rejected)', ['result']))
+render_api_requests_total = registry.register(Counter(
+    'pnl_render_api_requests_total', 'HTTP /render requests by method and status', ['method', 'status']))
+startup_seconds = registry.register(Gauge(
+    'pnl_startup_seconds', 'Seconds from process start until the bot was first ready'))
+command_sync_seconds = registry.register(Gauge(
+    'pnl_command_sync_seconds', 'Seconds the last slash command sync check took'))
+command_sync_total = registry.register(Counter(
+    'pnl_command_sync_total', 'Slash command tree sync checks by result (synced, skipped, failed)', ['result']))
+event_loop_lag_seconds = registry.register(Histogram(
+    'pnl_event_loop_lag_seconds', 'How late the event loop woke a periodic timer',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)))
+
+_loop_monitor: Optional[asyncio.Task] = None
+
+
+async def _monitor_event_loop(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag_seconds.observe(max(0.0, loop.time() - start - interval))
+
+
+def start_loop_monitor(interval: float = 0.5):
+    """Start sampling event-loop lag on the running loop, once per process"""
+    global _loop_monitor
+    if _loop_monitor is None or _loop_monitor.done():
+        _loop_monitor = asyncio.get_running_loop().create_task(_monitor_event_loop(interval))
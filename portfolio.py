@@ -0,0 +1,165 @@
+"""
+Multi-trade portfolio summaries
+Trades are parsed straight into NumPy arrays and aggregated with array
+operations, so large trade histories summarize in milliseconds
+"""
+
+import csv
+import io
+import json
+import math
+from typing import Dict, List
+
+import numpy as np
+
+import config
+from card import PNLCard
+from prices import SUPPORTED_CHAINS
+
+# Chain order used for the integer chain column
+CHAINS = list(SUPPORTED_CHAINS)
+
+
+class Trades:
+    """Column-oriented trade history"""
+
+    def __init__(self, coins: List[str], bought: np.ndarray, sold: np.ndarray, chains: np.ndarray):
+        self.coins = coins
+        self.bought = bought
+        self.sold = sold
+        self.chains = chains
+
+    def __len__(self) -> int:
+        return len(self.coins)
+
+
+def _chain_index(value) -> int:
+    chain = str(value or 'SOL').strip().upper()
+    if chain not in SUPPORTED_CHAINS:
+        raise ValueError(f"unsupported chain {chain}")
+    return CHAINS.index(chain)
+
+
+def parse_trades(text: str) -> Trades:
+    """Parse trades given as CSV (with a header), JSONL, or inline `COIN BOUGHT SOLD [CHAIN]` entries
+
+    Inline entries are separated by newlines or semicolons. Raises ValueError
+    naming the first bad entry.
+    """
+    text = text.strip()
+    if not text:
+        raise ValueError("no trades given")
+
+    coins, bought, sold, chains = [], [], [], []
+
+    def add(number, coin, b, s, chain):
+        try:
+            amounts = float(b), float(s)
+            if not all(math.isfinite(amount) for amount in amounts):
+                raise ValueError("amounts must be finite numbers")
+            chain_index = _chain_index(chain)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"trade {number}: {e}") from e
+        coins.append(str(coin).upper())
+        bought.append(amounts[0])
+        sold.append(amounts[1])
+        chains.append(chain_index)
+        if len(coins) > config.PORTFOLIO_MAX_TRADES:
+            raise ValueError(f"too many trades (max {config.PORTFOLIO_MAX_TRADES})")
+
+    first_line = text.split('\n', 1)[0]
+    if text.startswith('{'):
+        for number, line in enumerate(text.splitlines(), 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"trade {number}: {e}") from e
+                if not isinstance(row, dict):
+                    raise ValueError(f"trade {number}: expected a JSON object")
+                add(number, row.get('coin_name'), row.get('bought_amount'), row.get('sold_amount'), row.get('chain'))
+    elif 'bought_amount' in first_line and ',' in first_line:
+        for number, row in enumerate(csv.DictReader(io.StringIO(text)), 1):
+            add(number, row.get('coin_name'), row.get('bought_amount'), row.get('sold_amount'), row.get('chain'))
+    else:
+        entries = [entry.split() for entry in text.replace(';', '\n').splitlines() if entry.strip()]
+        for number, fields in enumerate(entries, 1):
+            if len(fields) not in (3, 4):
+                raise ValueError(f"trade {number}: expected COIN BOUGHT SOLD [CHAIN]")
+            add(number, fields[0], fields[1], fields[2], fields[3] if len(fields) == 4 else 'SOL')
+
+    if not coins:
+        raise ValueError("no trades given")
+    return Trades(coins, np.asarray(bought, dtype=np.float64), np.asarray(sold, dtype=np.float64),
+                  np.asarray(chains, dtype=np.int8))
+
+
+def summarize(trades: Trades, prices: Dict[str, float]) -> Dict:
+    """Totals, win rate, best/worst multiplier and per-chain PnL for a trade history"""
+    chain_prices = np.array([prices[chain] for chain in CHAINS], dtype=np.float64)
+    trade_prices = chain_prices[trades.chains]
+
+    pnl = trades.sold - trades.bought
+    pnl_usd = pnl * trade_prices
+    invested_usd = trades.bought * trade_prices
+    returned_usd = trades.sold * trade_prices
+
+    multipliers = np.divide(trades.sold, trades.bought, out=np.zeros_like(trades.sold), where=trades.bought > 0)
+    best, worst = int(np.argmax(multipliers)), int(np.argmin(multipliers))
+
+    counts = np.bincount(trades.chains, minlength=len(CHAINS))
+    native_by_chain = np.bincount(trades.chains, weights=pnl, minlength=len(CHAINS))
+    usd_by_chain = np.bincount(trades.chains, weights=pnl_usd, minlength=len(CHAINS))
+
+    return {
+        'trades': len(trades),
+        'invested_usd': float(invested_usd.sum()),
+        'returned_usd': float(returned_usd.sum()),
+        'pnl_usd': float(pnl_usd.sum()),
+        'win_rate': float(np.count_nonzero(pnl > 0) / len(trades)),
+        'best': {'coin': trades.coins[best], 'multiplier': float(multipliers[best])},
+        'worst': {'coin': trades.coins[worst], 'multiplier': float(multipliers[worst])},
+        'chains': {
+            chain: {'trades': int(counts[i]), 'pnl': float(native_by_chain[i]), 'pnl_usd': float(usd_by_chain[i])}
+            for i, chain in enumerate(CHAINS) if counts[i]
+        },
+    }
+
+
+def _usd(value: float) -> str:
+    return f"${abs(value)/1000:.1f}K" if abs(value) >= 1000 else f"${abs(value):,.0f}"
+
+
+class PortfolioCard(PNLCard):
+    """Summary card for a whole trade history, drawn with the regular theme layouts"""
+
+    def __init__(self, username: str, summary: Dict, theme: str = 'cyberpunk'):
+        super().__init__(username, 'PORTFOLIO', summary['invested_usd'], summary['returned_usd'],
+                         1.0, 'USD', theme)
+        self.summary = summary
+
+    def card_text(self) -> Dict[str, str]:
+        summary = self.summary
+        sign = "+" if self.is_profit else "-"
+        if self.theme_config['layout']['name'] == 'terminal':
+            return {
+                'coin': f"{summary['trades']} TRADES",
+                'multiplier': f"{self.multiplier:.1f}X",
+                'profit_usd': f"{sign}{_usd(self.pnl_usd)}",
+                'bought': _usd(self.bought_amount),
+                'sold': _usd(self.sold_amount),
+                'profit': f"{sign}{_usd(self.pnl_usd)}",
+                'user': f"@{self.username.upper()}",
+            }
+
+        return {
+            'coin': f"> PORTFOLIO: {summary['trades']} TRADES",
+            'profit': f"PROFIT: +{_usd(self.pnl_usd)}" if self.is_profit else f"LOSS: -{_usd(self.pnl_usd)}",
+            'profit_usd': f"> WIN RATE {summary['win_rate'] * 100:.0f}%",
+            'bought': f"INVESTED: {_usd(self.bought_amount)}",
+            'bought_usd': f"> BEST {summary['best']['coin']} {summary['best']['multiplier']:.1f}X",
+            'sold': f"RETURNED: {_usd(self.sold_amount)}",
+            'sold_usd': f"> WORST {summary['worst']['coin']} {summary['worst']['multiplier']:.1f}X",
+            'user': f"USER: {self.username.upper()}",
+            'chain': "> " + " ".join(summary['chains']),
+        }
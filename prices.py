@@ -0,0 +1,297 @@
+"""
+Token price lookup
+Prices for every chain are fetched in one batched request from pluggable
+sources, hedged across sources and guarded by per-source circuit breakers,
+then kept in an in-memory TTL cache shared by all callers
+"""
+
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+import config
+from metrics import price_cache_total, price_fallbacks_total
+
+# Supported chains with their CoinGecko IDs and display symbols
+SUPPORTED_CHAINS = {
+    'SOL': {'id': 'solana', 'symbol': 'SOL', 'fallback_price': 100.0},
+    'BNB': {'id': 'binancecoin', 'symbol': 'BNB', 'fallback_price': 300.0},
+    'ETH': {'id': 'ethereum', 'symbol': 'ETH', 'fallback_price': 2000.0},
+}
+
+COINGECKO_PRICE_URL = 'https://api.coingecko.com/api/v3/simple/price'
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the process-wide pooled HTTP session for the running loop"""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+    return _session
+
+
+async def close_session():
+    """Close the pooled HTTP session"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+class PriceSource:
+    """A place prices can be fetched from, one batched call per lookup"""
+
+    name = 'source'
+
+    async def fetch(self, token_ids: List[str]) -> Dict[str, float]:
+        """Return USD prices keyed by token id"""
+        raise NotImplementedError
+
+
+class CoinGeckoSource(PriceSource):
+    """CoinGecko /simple/price, or any server speaking the same format"""
+
+    def __init__(self, url: str = COINGECKO_PRICE_URL):
+        self.url = url
+        self.name = url
+
+    async def fetch(self, token_ids: List[str]) -> Dict[str, float]:
+        params = {'ids': ','.join(token_ids), 'vs_currencies': 'usd'}
+        async with get_session().get(self.url, params=params) as response:
+            response.raise_for_status()
+            data = await response.json()
+        return {token_id: float(data[token_id]['usd']) for token_id in token_ids if token_id in data}
+
+
+class FileSource(PriceSource):
+    """JSON snapshot in CoinGecko's response format, for tests and offline runs"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = f'file:{path}'
+
+    async def fetch(self, token_ids: List[str]) -> Dict[str, float]:
+        # Read in a thread, a slow disk shouldn't stall the event loop
+        data = await asyncio.to_thread(self._read)
+        return {token_id: float(data[token_id]['usd']) for token_id in token_ids if token_id in data}
+
+    def _read(self) -> Dict:
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+
+class CircuitBreaker:
+    """Skips a source after repeated failures until a cool-down has passed, then lets one probe through"""
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold or config.PRICE_BREAKER_FAILURES
+        self.reset_timeout = config.PRICE_BREAKER_RESET if reset_timeout is None else reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Whether the half-open trial request is in flight
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def available(self) -> bool:
+        """Whether allow() would let a request through now, without claiming the probe"""
+        state = self.state
+        return state == 'closed' or (state == 'half-open' and not self.probing)
+
+    def allow(self) -> bool:
+        """Closed breakers let every request through, half-open ones a single probe until it finishes"""
+        state = self.state
+        if state == 'half-open' and not self.probing:
+            self.probing = True
+            return True
+        return state == 'closed'
+
+    def release(self):
+        """Give up the probe without a result, e.g. when it was cancelled"""
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.probing = False
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class PriceProvider:
+    """Fetches every supported chain at once, hedging across sources"""
+
+    def __init__(self, sources: List[PriceSource], timeout: Optional[float] = None,
+                 hedge_delay: Optional[float] = None):
+        self.use_sources(sources)
+        self.timeout = config.PRICE_TIMEOUT if timeout is None else timeout
+        self.hedge_delay = config.PRICE_HEDGE_DELAY if hedge_delay is None else hedge_delay
+
+    def use_sources(self, sources: List[PriceSource]):
+        """Replace the sources, with fresh circuit breakers"""
+        self.sources = sources
+        self.breakers = {source.name: CircuitBreaker() for source in sources}
+
+    async def fetch_all(self) -> Dict[str, float]:
+        """Return prices keyed by chain from the first source to answer"""
+        token_ids = [info['id'] for info in SUPPORTED_CHAINS.values()]
+        candidates = [s for s in self.sources if self.breakers[s.name].available()]
+        if not candidates:
+            raise RuntimeError("All price sources are unavailable")
+
+        pending = set()
+        errors = []
+        try:
+            for index, source in enumerate(candidates):
+                pending.add(asyncio.ensure_future(self._attempt(source, token_ids)))
+                # Give the running attempts a head start before racing in the next source
+                last = index == len(candidates) - 1
+                result = await self._first_success(pending, errors, None if last else self.hedge_delay)
+                if result is not None:
+                    return self._by_chain(result)
+            raise RuntimeError(f"All price sources failed: {'; '.join(errors)}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _first_success(self, pending: set, errors: List[str],
+                             wait: Optional[float]) -> Optional[Dict[str, float]]:
+        """Wait up to `wait` seconds (or until all finish) for a successful attempt"""
+        deadline = None if wait is None else time.monotonic() + wait
+        while pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                return None
+            for task in done:
+                pending.discard(task)
+                if task.exception() is None:
+                    return task.result()
+                errors.append(str(task.exception()))
+        return None
+
+    async def _attempt(self, source: PriceSource, token_ids: List[str]) -> Dict[str, float]:
+        breaker = self.breakers[source.name]
+        # Checked when the attempt starts, hedged sources may start well after fetch_all picked them
+        probe = breaker.state == 'half-open'
+        if not breaker.allow():
+            raise RuntimeError(f"{source.name}: circuit open")
+        try:
+            prices = await asyncio.wait_for(source.fetch(token_ids), self.timeout)
+            if not prices:
+                raise ValueError("empty price response")
+        except asyncio.CancelledError:
+            if probe:
+                breaker.release()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            raise RuntimeError(f"{source.name}: {e or type(e).__name__}") from e
+        breaker.record_success()
+        return prices
+
+    @staticmethod
+    def _by_chain(prices: Dict[str, float]) -> Dict[str, float]:
+        return {chain: prices[info['id']] for chain, info in SUPPORTED_CHAINS.items() if info['id'] in prices}
+
+
+def build_sources(spec: Optional[str] = None) -> List[PriceSource]:
+    """Parse a PRICE_SOURCES style spec into price sources"""
+    sources = []
+    for entry in (spec or config.PRICE_SOURCES).split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if entry.startswith('file:'):
+            sources.append(FileSource(entry[len('file:'):]))
+        else:
+            sources.append(CoinGeckoSource(entry))
+    return sources
+
+
+class PriceCache:
+    """Per-chain price cache with single-flight refresh and stale-while-revalidate"""
+
+    def __init__(self, fetch_all: Callable[[], Awaitable[Dict[str, float]]], ttl: Optional[float] = None):
+        self._fetch_all = fetch_all
+        self.ttl = config.PRICE_CACHE_TTL if ttl is None else ttl
+        self._entries: Dict[str, Tuple[float, float]] = {}   # chain -> (price, fetched_at)
+        self._inflight: Optional[asyncio.Task] = None
+
+    async def get(self, chain: str) -> float:
+        """Return the cached price, fetching it if the cache is cold"""
+        entry = self._entries.get(chain)
+        if entry is not None:
+            price, fetched_at = entry
+            if time.monotonic() - fetched_at >= self.ttl:
+                price_cache_total.inc(result='stale')
+                self._refresh()
+            else:
+                price_cache_total.inc(result='fresh')
+            return price
+
+        price_cache_total.inc(result='miss')
+        # Shield so a cancelled caller doesn't cancel the shared request
+        prices = await asyncio.shield(self._refresh())
+        return prices[chain]
+
+    def peek(self, chain: str) -> Optional[float]:
+        """Return the cached price without fetching, or None"""
+        entry = self._entries.get(chain)
+        return entry[0] if entry else None
+
+    def clear(self):
+        self._entries.clear()
+
+    def _refresh(self) -> asyncio.Task:
+        """Start a batched fetch unless one is already in flight"""
+        if self._inflight is None:
+            self._inflight = asyncio.get_running_loop().create_task(self._load())
+            self._inflight.add_done_callback(self._finish)
+        return self._inflight
+
+    async def _load(self) -> Dict[str, float]:
+        prices = await self._fetch_all()
+        fetched_at = time.monotonic()
+        for chain, price in prices.items():
+            self._entries[chain] = (price, fetched_at)
+        return prices
+
+    def _finish(self, task: asyncio.Task):
+        self._inflight = None
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error refreshing prices: {task.exception()}")
+
+
+price_provider = PriceProvider(build_sources())
+price_cache = PriceCache(price_provider.fetch_all)
+
+
+async def get_token_price(chain: str = 'SOL') -> float:
+    """Get current token price, served from the cache when possible"""
+    chain = chain.upper() if chain.upper() in SUPPORTED_CHAINS else 'SOL'
+    try:
+        return await price_cache.get(chain)
+    except Exception as e:
+        print(f"Error fetching {chain} price: {e}")
+        price_fallbacks_total.inc(chain=chain)
+        return SUPPORTED_CHAINS[chain]['fallback_price']
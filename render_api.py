@@ -0,0 +1,178 @@
+"""
+HTTP render API on the keep-alive server
+GET /render renders one card from query parameters, POST /render renders a
+JSON batch and streams the results back as NDJSON. Cards go through the same
+price cache, render scheduler and card cache as /pnl, and every card's ETag is
+its content address, so conditional requests are answered without rendering.
+"""
+
+import base64
+import hmac
+import json
+from typing import Dict, Optional
+
+from aiohttp import web
+
+import config
+from card import PNLCard, THEMES
+from metrics import render_api_requests_total
+from prices import SUPPORTED_CHAINS, get_token_price
+from scheduler import SchedulerBusy, render_scheduler
+
+CONTENT_TYPES = {'png': 'image/png', 'webp': 'image/webp', 'jpg': 'image/jpeg', 'gif': 'image/gif'}
+CHUNK_SIZE = 64 * 1024
+
+
+class RenderRequestError(ValueError):
+    """A render request with missing or invalid parameters"""
+
+
+def _flag(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+async def build_card(params: Dict) -> PNLCard:
+    """Validate /pnl-style parameters and turn them into a card at the current price"""
+    try:
+        username = str(params['username'])
+        coin_name = str(params['coin_name'])
+        bought_amount = float(params['bought_amount'])
+        sold_amount = float(params['sold_amount'])
+    except KeyError as e:
+        raise RenderRequestError(f"missing parameter {e.args[0]}") from e
+    except (TypeError, ValueError) as e:
+        raise RenderRequestError("bought_amount and sold_amount must be numbers") from e
+
+    chain = str(params.get('chain') or 'SOL').upper()
+    if chain not in SUPPORTED_CHAINS:
+        raise RenderRequestError(f"unsupported chain {chain}")
+    theme = str(params.get('theme') or 'cyberpunk').lower()
+    if theme not in THEMES:
+        raise RenderRequestError(f"unknown theme {theme}")
+
+    token_price = await get_token_price(chain)
+    return PNLCard(username, coin_name, bought_amount, sold_amount, token_price, chain, theme,
+                   _flag(params.get('animated', False)))
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag, using the weak comparison RFC 9110 asks for"""
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    return '*' in candidates or any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def _client(request: web.Request) -> str:
+    """Scheduler key for the caller, trusting X-Forwarded-For only from the local sharding launcher"""
+    remote = request.remote
+    if config.BEHIND_LAUNCHER and remote in ('127.0.0.1', '::1') and 'X-Forwarded-For' in request.headers:
+        remote = request.headers['X-Forwarded-For'].split(',')[0].strip()
+    return f"http:{remote}"
+
+
+def _error(status: int, message: str, method: str, **headers) -> web.Response:
+    render_api_requests_total.inc(method=method, status=status)
+    return web.json_response({'error': message}, status=status, headers=headers)
+
+
+def _authorized(request: web.Request) -> bool:
+    if not config.RENDER_API_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {config.RENDER_API_TOKEN}")
+
+
+async def handle_render_get(request: web.Request) -> web.StreamResponse:
+    """Render one card from query parameters and return its bytes"""
+    if not _authorized(request):
+        return _error(401, "missing or invalid token", 'GET')
+    try:
+        card = await build_card(dict(request.query))
+    except RenderRequestError as e:
+        return _error(400, str(e), 'GET')
+
+    key = card.cache_key()
+    etag = f'"{key}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        render_api_requests_total.inc(method='GET', status=304)
+        return web.Response(status=304, headers=headers)
+
+    try:
+        image = await render_scheduler.render(_client(request), card, key=key)
+    except SchedulerBusy:
+        return _error(503, "renderer is busy, try again shortly", 'GET', **{'Retry-After': '5'})
+
+    data = image.getbuffer()
+    response = web.StreamResponse(headers=headers)
+    response.content_type = CONTENT_TYPES[card.file_extension]
+    response.content_length = len(data)
+    await response.prepare(request)
+    for start in range(0, len(data), CHUNK_SIZE):
+        await response.write(data[start:start + CHUNK_SIZE])
+    await response.write_eof()
+    render_api_requests_total.inc(method='GET', status=200)
+    return response
+
+
+async def handle_render_post(request: web.Request) -> web.StreamResponse:
+    """Render a batch of cards, streaming one NDJSON line per card as each finishes
+
+    The body is a JSON list of /pnl parameter objects, or {"cards": [...]}.
+    A card whose "etag" field matches its current ETag comes back as
+    {"status": 304} without image data.
+    """
+    if not _authorized(request):
+        return _error(401, "missing or invalid token", 'POST')
+    try:
+        body = await request.json()
+    except ValueError:
+        return _error(400, "body must be JSON", 'POST')
+    cards = body.get('cards') if isinstance(body, dict) else body
+    if not isinstance(cards, list) or not cards:
+        return _error(400, "expected a non-empty list of cards", 'POST')
+    if len(cards) > config.RENDER_API_MAX_BATCH:
+        return _error(413, f"at most {config.RENDER_API_MAX_BATCH} cards per batch", 'POST')
+
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+
+    client = _client(request)
+    for index, params in enumerate(cards):
+        line = {'index': index}
+        try:
+            if not isinstance(params, dict):
+                raise RenderRequestError("each card must be an object")
+            card = await build_card(params)
+            key = card.cache_key()
+            etag = f'"{key}"'
+            line['etag'] = etag
+            if _etag_matches(params.get('etag'), etag):
+                line['status'] = 304
+            else:
+                # One card at a time, so a batch gets the same share of the renderer as one user
+                image = await render_scheduler.render(client, card, key=key)
+                line.update(status=200, content_type=CONTENT_TYPES[card.file_extension],
+                            data=base64.b64encode(image.getvalue()).decode('ascii'))
+        except RenderRequestError as e:
+            line.update(status=400, error=str(e))
+        except SchedulerBusy:
+            line.update(status=503, error="renderer is busy, try again shortly")
+        except Exception as e:
+            line.update(status=500, error=str(e))
+        await response.write((json.dumps(line) + '\n').encode('utf-8'))
+
+    await response.write_eof()
+    render_api_requests_total.inc(method='POST', status=200)
+    return response
+
+
+def add_routes(app: web.Application):
+    """Serve /render, only when RENDER_API_TOKEN is set since the port is public"""
+    if not config.RENDER_API_TOKEN:
+        print("🔒 /render is off, set RENDER_API_TOKEN to enable it")
+        return
+    app.router.add_get('/render', handle_render_get)
+    app.router.add_post('/render', handle_render_post)
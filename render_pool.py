@@ -0,0 +1,127 @@
+"""
+Render executor that keeps card generation off the discord.py event loop
+"""
+
+import asyncio
+import io
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+import config
+from card import PNLCard, warm_theme_assets
+from card_cache import card_cache
+from metrics import (card_encode_seconds_total, card_encoded_bytes_total, card_encodes_total, phase_seconds,
+                     render_peak_rss_bytes, renders_in_flight)
+
+
+def _render_card(card: PNLCard, measure_memory: bool) -> Tuple[bytes, Optional[Dict], Optional[Dict]]:
+    """Render a card inside a worker and return the encoded image, encode stats and peak memory if measured"""
+    # The parent process owns the card cache
+    data = card.generate_card(use_cache=False, measure_memory=measure_memory).getvalue()
+    return data, card.encode_info, card.memory
+
+
+def _noop():
+    return None
+
+
+class RenderPool:
+    """Thread or process pool that renders PNL cards in parallel"""
+
+    def __init__(self, workers: Optional[int] = None, kind: Optional[str] = None):
+        self.workers = max(1, workers or config.RENDER_WORKERS)
+        self.kind = (kind or config.RENDER_EXECUTOR).lower()
+        self._executor: Optional[Executor] = None
+        self._start_lock = threading.Lock()
+        # Thread workers share one process and would reset each other's high-water mark
+        self.measure_memory = config.RENDER_MEMORY_STATS and self.kind != 'thread'
+        self.in_flight = 0
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def start(self):
+        """Create the executor and pre-warm theme assets in every worker
+
+        Blocks until the workers are up, call it off the event loop
+        """
+        with self._start_lock:
+            if self._executor is None:
+                self._start()
+
+    def _restart(self, broken: Executor):
+        """Replace an executor that lost a worker, unless another render already replaced it"""
+        with self._start_lock:
+            if self._executor is not broken:
+                return
+            print("❌ A render worker died, restarting the render pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._start()
+
+    def _start(self):
+        # Warm the parent first so forked workers inherit the decoded assets
+        warm_theme_assets()
+        if self.kind == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix='render')
+        else:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_theme_assets)
+            # Force every worker up now rather than on the first /pnls. Under spawn and forkserver
+            # the pool only starts a process per task submitted while none is idle, so send one each
+            for future in [executor.submit(_noop) for _ in range(self.workers)]:
+                future.result()
+            self._executor = executor
+        print(f"🎨 Render pool started ({self.workers} {self.kind} worker(s))")
+
+    async def render(self, card: PNLCard, key: Optional[str] = None) -> io.BytesIO:
+        """Render a card on the pool without blocking the event loop
+
+        Callers that already missed the card cache pass the card's key, so the
+        lookup isn't repeated and counted twice
+        """
+        if key is None:
+            key = card.cache_key()
+            data = card_cache.get(key)
+            if data is not None:
+                return io.BytesIO(data)
+
+        if self._executor is None:
+            await asyncio.to_thread(self.start)
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            executor = self._executor
+            try:
+                data, encode_info, memory = await loop.run_in_executor(executor, _render_card, card,
+                                                                       self.measure_memory)
+            except BrokenProcessPool:
+                # A killed or crashed worker breaks the whole pool, rebuild it and try this card once more
+                await asyncio.to_thread(self._restart, executor)
+                data, encode_info, memory = await loop.run_in_executor(self._executor, _render_card, card,
+                                                                       self.measure_memory)
+        finally:
+            self.in_flight -= 1
+        if encode_info is not None:
+            # Workers' own counters die with them, so encode stats are recorded here in the parent
+            phase_seconds.observe(encode_info['seconds'], phase='encode')
+            card_encodes_total.inc(format=encode_info['format'])
+            card_encoded_bytes_total.inc(encode_info['bytes'], format=encode_info['format'])
+            card_encode_seconds_total.inc(encode_info['seconds'], format=encode_info['format'])
+        if memory and memory['peak_rss_kb'] is not None:
+            render_peak_rss_bytes.observe(memory['peak_rss_kb'] * 1024, kind='animated' if card.animated else 'still')
+        card_cache.put(key, data)
+        return io.BytesIO(data)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the executor, waiting for in-flight renders by default"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+render_pool = RenderPool()
+renders_in_flight.set_function(lambda: render_pool.in_flight)
@@ -2,8 +2,15 @@
 """
 Discord PNL Card Bot Runner
 This script checks for dependencies and runs the bot
+
+Usage:
+    python run_bot.py                              # single process
+    python run_bot.py --workers 4                  # single process with 4 render workers
+    python run_bot.py --processes 4                # 4 shard processes, one shard each
+    python run_bot.py --processes 2 --shards 8     # 8 shards across 2 processes
 """
 
+import argparse
 import sys
 import os
 import subprocess
@@ -13,7 +20,8 @@ def check_dependencies():
     required_packages = [
         'discord.py',
         'Pillow',
-        'python-dotenv'
+        'python-dotenv',
+        'numpy'
     ]
     
     missing_packages = []
@@ -25,6 +33,8 @@ def check_dependencies():
                 import PIL
             elif package == 'python-dotenv':
                 import dotenv
+            elif package == 'numpy':
+                import numpy
         except ImportError:
             missing_packages.append(package)
     
@@ -50,6 +60,13 @@ def check_env_file():
     return True, "Environment file is valid"
 
 def main():
+    parser = argparse.ArgumentParser(description='Run the Discord PNL Card Bot')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='shard processes to run, each with its own render workers')
+    parser.add_argument('--shards', type=int, help='total shards (default: one per process)')
+    parser.add_argument('--workers', type=int, help='render workers per process (default: cores / processes)')
+    args = parser.parse_args()
+
     print("🏴‍☠️ Discord PNL Card Bot Launcher")
     print("=" * 40)
     
@@ -85,8 +102,16 @@ def main():
     print("-" * 40)
     
     try:
-        # Import and run the bot
-        import bot
+        if args.processes > 1 or args.shards:
+            import launcher
+            launcher.main(args.processes, args.shards, args.workers)
+        else:
+            if args.workers:
+                # Read by config when bot is imported below
+                os.environ['RENDER_WORKERS'] = str(args.workers)
+            # Import and run the bot
+            import bot
+            bot.main()
     except KeyboardInterrupt:
         print("\n🛑 Bot stopped by user")
     except Exception as e:
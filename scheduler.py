@@ -0,0 +1,169 @@
+"""
+Admission control in front of the render pool
+Renders wait in per-user queues that are served round-robin, each user has a
+cap on concurrent renders, and work that can't start before its deadline is
+shed up front with a busy reply rather than timing out later
+"""
+
+import asyncio
+import collections
+import io
+import time
+from typing import Deque, Dict, Hashable, Optional, Set
+
+import config
+from card import PNLCard
+from card_cache import card_cache
+from metrics import render_queue_depth, renders_shed_total
+from render_pool import RenderPool, render_pool
+
+
+class SchedulerBusy(Exception):
+    """Raised when a render is shed instead of being queued or run"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"render shed: {reason}")
+        self.reason = reason
+
+
+class _Job:
+    __slots__ = ('user', 'card', 'key', 'deadline', 'future')
+
+    def __init__(self, user: Hashable, card: PNLCard, key: str, deadline: float, future: asyncio.Future):
+        self.user = user
+        self.card = card
+        self.key = key
+        self.deadline = deadline
+        self.future = future
+
+
+class RenderScheduler:
+    """Bounded, per-user fair queue feeding a RenderPool"""
+
+    def __init__(self, pool: RenderPool, max_queue: Optional[int] = None, user_concurrency: Optional[int] = None,
+                 user_queue: Optional[int] = None, deadline: Optional[float] = None):
+        self.pool = pool
+        self.max_queue = config.RENDER_QUEUE_SIZE if max_queue is None else max_queue
+        self.user_concurrency = max(1, user_concurrency or config.RENDER_USER_CONCURRENCY)
+        self.user_queue = config.RENDER_USER_QUEUE if user_queue is None else user_queue
+        self.deadline = deadline or config.RENDER_DEADLINE
+        # Users with waiting jobs, in round-robin order
+        self._queues: 'collections.OrderedDict[Hashable, Deque[_Job]]' = collections.OrderedDict()
+        self._active: Dict[Hashable, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.queued = 0
+        self.closing = False
+        # Moving average of render seconds, used to predict queue wait
+        self.render_seconds = 0.25
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    def estimated_wait(self) -> float:
+        """Seconds a job queued now would wait before a worker picks it up"""
+        if self.running < self.pool.workers:
+            return 0.0
+        return (self.queued // self.pool.workers + 1) * self.render_seconds
+
+    async def render(self, user: Hashable, card: PNLCard, deadline: Optional[float] = None,
+                     key: Optional[str] = None) -> io.BytesIO:
+        """Render a card for a user, raising SchedulerBusy if it can't start within the deadline
+
+        `key` is the card's cache_key() for callers that already computed it
+        """
+        key = card.cache_key() if key is None else key
+        data = card_cache.get(key)
+        if data is not None:
+            return io.BytesIO(data)
+
+        timeout = self.deadline if deadline is None else deadline
+        if self.closing:
+            self._shed('shutdown')
+        if self.queued >= self.max_queue:
+            self._shed('queue_full')
+        user_jobs = self._active.get(user, 0) + len(self._queues.get(user, ()))
+        if user_jobs >= self.user_concurrency + self.user_queue:
+            self._shed('user_limit')
+        if self.estimated_wait() > timeout:
+            self._shed('deadline')
+
+        job = _Job(user, card, key, time.monotonic() + timeout, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(user, collections.deque()).append(job)
+        self.queued += 1
+        self._dispatch()
+        return await job.future
+
+    def _shed(self, reason: str):
+        renders_shed_total.inc(reason=reason)
+        raise SchedulerBusy(reason)
+
+    def _next_job(self) -> Optional[_Job]:
+        """Pop the next job from the first user in round-robin order who is under their cap"""
+        for user in list(self._queues):
+            if self._active.get(user, 0) >= self.user_concurrency:
+                continue
+            jobs = self._queues[user]
+            job = jobs.popleft()
+            self.queued -= 1
+            if jobs:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            return job
+        return None
+
+    def _dispatch(self):
+        """Start queued jobs while workers are free"""
+        while self.running < self.pool.workers:
+            job = self._next_job()
+            if job is None:
+                return
+            if job.future.done():
+                # The caller gave up while it was queued
+                continue
+            if time.monotonic() > job.deadline:
+                renders_shed_total.inc(reason='deadline')
+                job.future.set_exception(SchedulerBusy('deadline'))
+                continue
+
+            self._active[job.user] = self._active.get(job.user, 0) + 1
+            task = asyncio.get_running_loop().create_task(self._run(job))
+            self._tasks.add(task)
+
+    async def _run(self, job: _Job):
+        start = time.perf_counter()
+        try:
+            result = await self.pool.render(job.card, job.key)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.render_seconds = 0.8 * self.render_seconds + 0.2 * (time.perf_counter() - start)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._tasks.discard(asyncio.current_task())
+            self._active[job.user] -= 1
+            if not self._active[job.user]:
+                del self._active[job.user]
+            self._dispatch()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Stop admitting renders, shed the queue and wait for running renders to finish"""
+        self.closing = True
+        for jobs in self._queues.values():
+            for job in jobs:
+                if not job.future.done():
+                    renders_shed_total.inc(reason='shutdown')
+                    job.future.set_exception(SchedulerBusy('shutdown'))
+        self._queues.clear()
+        self.queued = 0
+
+        if self._tasks:
+            print(f"⏳ Waiting for {len(self._tasks)} render(s) to finish")
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+
+render_scheduler = RenderScheduler(render_pool)
+render_queue_depth.set_function(lambda: render_scheduler.queued)
@@ -12,7 +12,7 @@ from PIL import Image
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from bot import PNLCard, SUPPORTED_CHAINS
+    from bot import PNLCard, SUPPORTED_CHAINS, THEMES
     import config
 except ImportError as e:
     print(f"❌ Error importing modules: {e}")
@@ -46,6 +46,7 @@ def generate_sample_cards():
             'chain': 'SOL',
             'bought': 10.0,
             'sold': 15.0,
+            'theme': 'cyberpunk',
             'description': 'Profitable SOL trade'
         },
         {
@@ -55,6 +56,7 @@ def generate_sample_cards():
             'chain': 'SOL',
             'bought': 20.0,
             'sold': 12.0,
+            'theme': 'jjk',
             'description': 'Loss-making SOL trade'
         },
         {
@@ -64,6 +66,7 @@ def generate_sample_cards():
             'chain': 'BNB',
             'bought': 5.0,
             'sold': 8.0,
+            'theme': 'toji',
             'description': 'BNB chain trade'
         }
     ]
@@ -77,14 +80,6 @@ def generate_sample_cards():
             token_price = get_token_price_sync(chain)
             print(f"({i}/{len(samples)}) Creating {sample['description']}... ({chain} @ ${token_price:.2f})")
 
-            # Create PNL card with custom background
-            background_path = None
-            if os.path.exists(config.BACKGROUNDS_FOLDER):
-                for file in os.listdir(config.BACKGROUNDS_FOLDER):
-                    if file.lower().endswith(('.png', '.jpg', '.jpeg')) and not file.startswith('.'):
-                        background_path = f"{config.BACKGROUNDS_FOLDER}/{file}"
-                        break
-
             pnl_card = PNLCard(
                 username=sample['username'],
                 coin_name=sample['coin_name'],
@@ -92,14 +87,14 @@ def generate_sample_cards():
                 sold_amount=sample['sold'],
                 token_price=token_price,
                 chain=chain,
-                background_path=background_path
+                theme=sample['theme']
             )
             
             # Generate the card image
             card_image = pnl_card.generate_card()
 
             # Save to file
-            filename = f"sample_{sample['name']}.png"
+            filename = f"sample_{sample['name']}.{pnl_card.file_extension}"
             with open(filename, 'wb') as f:
                 f.write(card_image.getvalue())
 
@@ -146,6 +141,11 @@ def test_custom_card():
         if not coin_name:
             coin_name = "TOKEN"
 
+        print(f"Available themes: {', '.join(THEMES)}")
+        theme = input("🎨 Enter theme (default: cyberpunk): ").strip().lower()
+        if theme not in THEMES:
+            theme = 'cyberpunk'
+
         bought = input(f"💰 Enter {chain} spent (e.g., 50): ").strip()
         bought = float(bought) if bought else 50.0
 
@@ -154,19 +154,12 @@ def test_custom_card():
 
         print(f"\n🎨 Creating {username}'s {coin_name.upper()} PNL card on {chain}...")
 
-        # Create and generate card with custom background
-        background_path = None
-        if os.path.exists(config.BACKGROUNDS_FOLDER):
-            for file in os.listdir(config.BACKGROUNDS_FOLDER):
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')) and not file.startswith('.'):
-                    background_path = f"{config.BACKGROUNDS_FOLDER}/{file}"
-                    break
-
-        pnl_card = PNLCard(username, coin_name, bought, sold, token_price, chain, background_path)
+        # Create and generate card
+        pnl_card = PNLCard(username, coin_name, bought, sold, token_price, chain, theme)
         card_image = pnl_card.generate_card()
 
         # Save the card
-        filename = f"custom_{username.lower()}_{coin_name.lower()}_pnl.png"
+        filename = f"custom_{username.lower()}_{coin_name.lower()}_pnl.{pnl_card.file_extension}"
         with open(filename, 'wb') as f:
             f.write(card_image.getvalue())
 
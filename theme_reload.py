@@ -0,0 +1,112 @@
+"""
+Hot reload of theme definitions and assets
+Polls themes.py and every theme's background and font files. When something
+changes, the affected themes are recompiled and their static layers rebuilt
+in a background thread, then swapped in on the event loop in one step, so
+renders never wait on a rebuild and never see half a reload
+"""
+
+import asyncio
+import runpy
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+import themes
+from assets import layer_cache, raw_store, source_stamp
+from card import THEMES
+from layout import DrawPlan, install_plan
+from metrics import theme_reloads_total
+
+THEMES_FILE = themes.__file__
+DEFAULT_THEME = 'cyberpunk'
+
+
+def theme_sources(theme_config: Dict) -> List[str]:
+    """Files a theme is drawn from"""
+    return [theme_config['background']] + [path for path, _ in theme_config['fonts'].values()]
+
+
+class ThemeWatcher:
+    """Swaps in edited themes, backgrounds and fonts without restarting the bot"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stamps = self._snapshot(THEMES)
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _snapshot(definitions: Dict[str, Dict]) -> Dict[str, Optional[int]]:
+        paths = sorted({THEMES_FILE, *(path for theme in definitions.values() for path in theme_sources(theme))})
+        return dict(zip(paths, source_stamp(paths)))
+
+    def start(self):
+        """Start polling on the running loop, once per process"""
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def check(self) -> List[str]:
+        """Reload whatever changed since the last check, returns the reloaded theme names"""
+        stamps = self._snapshot(THEMES)
+        changed = {path for path in stamps.keys() | self._stamps.keys() if stamps.get(path) != self._stamps.get(path)}
+        if not changed:
+            return []
+        # Recorded up front so a broken edit is reported once, not on every poll
+        self._stamps = stamps
+
+        try:
+            definitions, plans = await asyncio.to_thread(self._rebuild, THEMES_FILE in changed, changed)
+        except Exception as e:
+            theme_reloads_total.inc(result='failed')
+            print(f"❌ Theme reload failed, keeping the current themes: {e}")
+            return []
+
+        # No awaits until the swap is done: the event loop sees the old themes or the new ones, never a mix
+        stale = []
+        for plan in plans:
+            replaced = install_plan(plan)
+            if replaced is not None and replaced.version != plan.version:
+                stale.append(replaced)
+        for name in [name for name in THEMES if name not in definitions]:
+            del THEMES[name]
+        THEMES.update(definitions)
+        self._stamps = self._snapshot(THEMES)
+
+        await asyncio.to_thread(self._discard_layers, stale)
+        names = [plan.theme for plan in plans]
+        theme_reloads_total.inc(result='reloaded')
+        print(f"🔄 Reloaded themes: {', '.join(names) or 'none changed'}")
+        return names
+
+    @staticmethod
+    def _discard_layers(plans: List[DrawPlan]):
+        """Delete replaced plans' cached layers, their keys carry the old definition's hash so nothing else would"""
+        for plan in plans:
+            for key in (plan.static_key, plan.static_rgb_key):
+                layer_cache.discard(key)
+                raw_store.discard(key)
+
+    @staticmethod
+    def _rebuild(reload_definitions: bool, changed: Set[str]) -> Tuple[Dict[str, Dict], List[DrawPlan]]:
+        """Load the theme definitions and compile and warm the themes that changed"""
+        # A fresh namespace, so a broken themes.py never leaves the module half replaced
+        definitions = runpy.run_path(THEMES_FILE)['THEMES'] if reload_definitions else dict(THEMES)
+        if DEFAULT_THEME not in definitions:
+            raise ValueError(f"themes.py must define the default {DEFAULT_THEME} theme")
+
+        size = (config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+        plans = []
+        for name, theme_config in definitions.items():
+            if theme_config == THEMES.get(name) and not changed.intersection(theme_sources(theme_config)):
+                continue
+            plan = DrawPlan(name, theme_config, size)
+            plan.warm()
+            plans.append(plan)
+        return definitions, plans
+
+
+theme_watcher = ThemeWatcher(config.THEME_RELOAD_INTERVAL)
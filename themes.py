@@ -0,0 +1,143 @@
+"""
+Theme definitions
+Plain data with no imports, so the theme watcher can re-execute this module
+while the bot runs and swap the new definitions in
+"""
+
+# Layouts shared by the themes below, see layout.py for the format
+CYBERPUNK_LAYOUT = {
+    'name': 'cyberpunk',
+    'mode': 'RGB',
+    'fallback': 'grid',
+    'text': {
+        'coin': "> {coin}",
+        'profit': "{profit_word}: {sign}{pnl_k} {chain}",
+        'profit_usd': "> ${pnl_usd_k}",
+        'bought': "BOUGHT: {bought} {chain}",
+        'bought_usd': "> ${bought_usd_k}",
+        'sold': "SOLD: {sold} {chain}",
+        'sold_usd': "> ${sold_usd_k}",
+        'user': "USER: {user}",
+        'chain': "> {chain}",
+    },
+    'animated': ('pnl_k', 'pnl_usd_k'),
+    'static': [
+        {'op': 'brackets', 'inset': 20, 'size': 30, 'width': 3, 'color': 'accent'},
+    ],
+    'dynamic': [
+        {'op': 'text', 'text': 'coin', 'xy': (100, 130), 'font': 'medium', 'color': 'text'},
+        {'op': 'text', 'text': 'profit', 'xy': (100, 192), 'font': 'large', 'color': 'pnl'},
+        {'op': 'text', 'text': 'profit_usd', 'xy': (100, 225), 'font': 'small', 'color': 'accent'},
+        {'op': 'text', 'text': 'bought', 'xy': (100, 287), 'font': 'medium', 'color': 'muted'},
+        {'op': 'text', 'text': 'bought_usd', 'xy': (100, 320), 'font': 'small', 'color': (44, 44, 44)},
+        {'op': 'text', 'text': 'sold', 'xy': (100, 382), 'font': 'medium', 'color': 'muted'},
+        {'op': 'text', 'text': 'sold_usd', 'xy': (100, 415), 'font': 'small', 'color': (44, 44, 44)},
+        {'op': 'text', 'text': 'user', 'xy': (100, 472), 'font': 'medium', 'color': 'muted'},
+        {'op': 'text', 'text': 'chain', 'xy': (100, 505), 'font': 'small', 'color': (44, 44, 44)},
+    ],
+}
+
+# Retro terminal style
+TERMINAL_LAYOUT = {
+    'name': 'terminal',
+    'mode': 'RGBA',
+    'fallback': (30, 20, 10, 255),
+    'composite': True,
+    'scanlines': 4,
+    'text': {
+        'coin': "${coin}",
+        'multiplier': "{multiplier}X",
+        'profit_usd': "{sign}{pnl_usd_short}",
+        'bought': "{bought} {chain}",
+        'sold': "{sold} {chain}",
+        'profit': "{sign}{pnl_k} {chain}",
+        'user': "@{user}",
+    },
+    'animated': ('multiplier', 'pnl_k', 'pnl_usd_short'),
+    'static': [
+        # Dark panel
+        {'op': 'rect', 'box': (0, 0, 300, 'height'), 'color': (0, 0, 0), 'alpha': 240},
+        {'op': 'fade', 'x': (300, 420), 'color': (0, 0, 0), 'alpha': 240},
+        # Stat labels
+        {'op': 'text', 'text': "> INVESTED", 'xy': (35, 255), 'font': 'small', 'color': 'muted'},
+        {'op': 'text', 'text': "> RETURNED", 'xy': (35, 310), 'font': 'small', 'color': 'muted'},
+        {'op': 'text', 'text': "> PROFIT", 'xy': (35, 365), 'font': 'small', 'color': 'muted'},
+        # Decorative corners
+        {'op': 'line', 'points': ((18, 18), (75, 18)), 'color': 'accent', 'alpha': 200, 'width': 3},
+        {'op': 'line', 'points': ((18, 18), (18, 75)), 'color': 'accent', 'alpha': 200, 'width': 3},
+        {'op': 'line', 'points': ((18, 650), (75, 650)), 'color': 'accent', 'alpha': 200, 'width': 3},
+        {'op': 'line', 'points': ((18, 593), (18, 650)), 'color': 'accent', 'alpha': 200, 'width': 3},
+        {'op': 'scanlines', 'step': 4, 'color': (0, 0, 0, 20)},
+    ],
+    'dynamic': [
+        {'op': 'glow', 'text': 'coin', 'xy': (45, 35), 'font': 'title', 'color': (255, 150, 0), 'alpha': 40,
+         'radius': 4, 'spread': 8},
+        {'op': 'text', 'text': 'coin', 'xy': (45, 35), 'font': 'title', 'color': 'text'},
+        {'op': 'glow', 'text': 'multiplier', 'xy': (45, 85), 'font': 'large', 'color': 'pnl', 'alpha': 60,
+         'radius': 10},
+        {'op': 'text', 'text': 'multiplier', 'xy': (45, 90), 'font': 'large', 'color': 'pnl'},
+        {'op': 'text', 'text': 'profit_usd', 'xy': (45, 180), 'font': 'medium', 'color': 'accent'},
+        {'op': 'text', 'text': 'bought', 'xy': (220, 255), 'font': 'small', 'color': 'text'},
+        {'op': 'text', 'text': 'sold', 'xy': (220, 310), 'font': 'small', 'color': 'text'},
+        {'op': 'text', 'text': 'profit', 'xy': (220, 365), 'font': 'small', 'color': 'pnl'},
+        # Username with a block cursor just past its measured width
+        {'op': 'text', 'text': 'user', 'xy': (35, 450), 'font': 'medium', 'color': 'accent'},
+        {'op': 'cursor', 'after': 'user', 'x': 35, 'y': (455, 490), 'width': 18, 'gap': 4,
+         'font': 'medium', 'color': 'accent'},
+    ],
+}
+
+# Theme configurations
+THEMES = {
+    'cyberpunk': {
+        'layout': CYBERPUNK_LAYOUT,
+        'background': 'backgrounds/background.jpg',
+        'fonts': {
+            'title': ('fonts/ShareTechMono-Regular.ttf', 24),
+            'large': ('fonts/ShareTechMono-Regular.ttf', 24),
+            'medium': ('fonts/ShareTechMono-Regular.ttf', 24),
+            'small': ('fonts/ShareTechMono-Regular.ttf', 24),
+        },
+        'colors': {
+            'profit': (0, 255, 255),
+            'loss': (255, 50, 50),
+            'text': (255, 255, 255),
+            'muted': (120, 120, 120),
+            'accent': (0, 255, 255),
+        }
+    },
+    'jjk': {
+        'layout': TERMINAL_LAYOUT,
+        'background': 'backgrounds/jjk.webp',
+        'fonts': {
+            'title': ('fonts/PressStart2P.ttf', 32),
+            'large': ('fonts/VT323-Regular.ttf', 85),
+            'medium': ('fonts/VT323-Regular.ttf', 42),
+            'small': ('fonts/VT323-Regular.ttf', 34),
+        },
+        'colors': {
+            'profit': (255, 220, 50),
+            'loss': (255, 50, 50),
+            'text': (255, 255, 255),
+            'muted': (150, 150, 150),
+            'accent': (255, 120, 0),
+        }
+    },
+    'toji': {
+        'layout': TERMINAL_LAYOUT,
+        'background': 'backgrounds/toji.jpg',
+        'fonts': {
+            'title': ('fonts/PressStart2P.ttf', 32),
+            'large': ('fonts/VT323-Regular.ttf', 85),
+            'medium': ('fonts/VT323-Regular.ttf', 42),
+            'small': ('fonts/VT323-Regular.ttf', 34),
+        },
+        'colors': {
+            'profit': (255, 190, 60),      # Amber gold (matches lights)
+            'loss': (180, 50, 50),          # Dark red
+            'text': (255, 240, 220),        # Warm cream white
+            'muted': (160, 140, 110),       # Muted brown/tan
+            'accent': (255, 170, 50),       # Golden amber
+        }
+    }
+}
@@ -0,0 +1,229 @@
+"""
+User-uploaded card backgrounds
+Uploads are stored by content hash, decoded and fitted to the card once, and
+kept in a byte-bounded LRU on disk and, as compiled draw plans, in memory, so
+a background that is used again renders like a built-in theme
+"""
+
+import hashlib
+import io
+import os
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+import config
+from assets import background_cache, layer_cache, raw_store
+from layout import DrawPlan, layer_keys
+from metrics import background_uploads_total
+from themes import THEMES
+
+DIGEST_LENGTH = 32
+UPLOAD_FORMATS = ('PNG', 'JPEG', 'WEBP', 'GIF')
+
+
+class BackgroundRejected(Exception):
+    """An upload that can't be used as a background, the message is shown to the user"""
+
+
+def upload_theme(theme: str, digest: str) -> str:
+    """Name of a theme drawn over an uploaded background, keeps its cached layers apart from the theme's own"""
+    return f"{theme}@{digest}"
+
+
+def _plan_bytes(plan: DrawPlan) -> int:
+    """Pixel bytes a plan caches: the background, the static layer and, for composited layouts, its RGB copy"""
+    width, height = plan.size
+    return width * height * 4 * (3 if plan.composite else 2)
+
+
+class BackgroundUploads:
+    """Uploaded backgrounds keyed by the SHA-256 of the uploaded bytes"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None,
+                 max_pixels: Optional[int] = None, disk_max_bytes: Optional[int] = None,
+                 memory_max_bytes: Optional[int] = None):
+        self.directory = config.BACKGROUND_UPLOAD_DIR if directory is None else directory
+        self.max_bytes = config.BACKGROUND_UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_pixels = config.BACKGROUND_UPLOAD_MAX_PIXELS if max_pixels is None else max_pixels
+        self.disk_max_bytes = config.BACKGROUND_UPLOAD_DISK_BYTES if disk_max_bytes is None else disk_max_bytes
+        self.memory_max_bytes = (config.BACKGROUND_UPLOAD_MEMORY_BYTES if memory_max_bytes is None
+                                 else memory_max_bytes)
+        # digest -> {(theme, size): plan}, least recently used first
+        self._plans: "OrderedDict[str, Dict[Tuple[str, Tuple[int, int]], DrawPlan]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_size = 0
+
+    def add(self, data: bytes) -> str:
+        """Store an uploaded image and return its digest, only decoding images not seen before"""
+        if len(data) > self.max_bytes:
+            background_uploads_total.inc(result='rejected')
+            raise BackgroundRejected(f"Background is too large (max {self.max_bytes // (1024 * 1024)}MB).")
+        digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+        path = self.path(digest)
+        if self._touch(path):
+            background_uploads_total.inc(result='reused')
+            return digest
+
+        try:
+            image = self._decode(data)
+        except BackgroundRejected:
+            background_uploads_total.inc(result='rejected')
+            raise
+        os.makedirs(self.directory, exist_ok=True)
+        # Write beside the target and rename, so a concurrent reader never opens a partial file
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(temp, format='PNG', compress_level=1)
+        os.replace(temp, path)
+        background_uploads_total.inc(result='stored')
+        self._prune_disk()
+        return digest
+
+    def path(self, digest: str) -> str:
+        """Stored file of an upload"""
+        if len(digest) != DIGEST_LENGTH or not set(digest) <= set(string.hexdigits.lower()):
+            raise ValueError(f"Not a background digest: {digest!r}")
+        return os.path.join(self.directory, f"{digest}.png")
+
+    def theme_config(self, theme_config: Dict, digest: str) -> Dict:
+        """A theme definition drawn over an uploaded background"""
+        return dict(theme_config, background=self.path(digest))
+
+    def plan(self, theme: str, theme_config: Dict, digest: str, size: Tuple[int, int]) -> DrawPlan:
+        """The theme's draw plan over an uploaded background, recompiled when the theme changes"""
+        upload_config = self.theme_config(theme_config, digest)
+        with self._lock:
+            plan = self._plans.get(digest, {}).get((theme, size))
+            if plan is not None and plan.is_current(upload_config):
+                self._plans.move_to_end(digest)
+                return plan
+
+        plan = DrawPlan(upload_theme(theme, digest), upload_config, size)
+        with self._lock:
+            plans = self._plans.setdefault(digest, {})
+            self._plans.move_to_end(digest)
+            replaced = plans.get((theme, size))
+            if replaced is not None:
+                self.memory_size -= _plan_bytes(replaced)
+            plans[(theme, size)] = plan
+            self.memory_size += _plan_bytes(plan)
+            evicted = []
+            # The newest upload stays whatever its size, it's about to be rendered
+            while self.memory_size > self.memory_max_bytes and len(self._plans) > 1:
+                _, evicted_plans = self._plans.popitem(last=False)
+                self.memory_size -= sum(_plan_bytes(p) for p in evicted_plans.values())
+                evicted.extend(evicted_plans.values())
+
+        if replaced is not None and replaced.version != plan.version:
+            self._forget([replaced], background=False)
+        self._forget(evicted)
+        return plan
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'uploads': len(self._plans),
+                'plans': sum(len(plans) for plans in self._plans.values()),
+                'bytes': self.memory_size,
+            }
+
+    def clear(self):
+        """Drop every compiled upload plan and its cached layers, stored uploads are left alone"""
+        with self._lock:
+            plans = [plan for entry in self._plans.values() for plan in entry.values()]
+            self._plans.clear()
+            self.memory_size = 0
+        self._forget(plans)
+
+    def _decode(self, data: bytes) -> Image.Image:
+        """Decode an upload and fit it to the card, refusing anything over the pixel limit before decoding"""
+        size = (config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+        try:
+            with Image.open(io.BytesIO(data), formats=UPLOAD_FORMATS) as img:
+                width, height = img.size
+                if width * height > self.max_pixels:
+                    raise BackgroundRejected(
+                        f"Background is too large ({width}x{height}, max {self.max_pixels // 1_000_000} megapixels).")
+                # JPEGs decode straight at the smallest scale that still covers the card
+                img.draft('RGB', size)
+                image = ImageOps.exif_transpose(img).convert('RGB')
+        except BackgroundRejected:
+            raise
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise BackgroundRejected("Background must be a PNG, JPEG, WebP or GIF image.") from e
+        # Cropped to the card's shape rather than stretched, unlike the theme backgrounds
+        return ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        """Mark a stored upload as just used, returns False if it isn't stored"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            # Only the access time, the modification time is part of every layer's source stamp
+            os.utime(path, ns=(time.time_ns(), mtime))
+        except OSError:
+            return False
+        return True
+
+    def _forget(self, plans: List[DrawPlan], background: bool = True):
+        """Drop the layers and backgrounds this process cached for plans"""
+        for plan in plans:
+            layer_cache.discard(plan.static_key)
+            layer_cache.discard(plan.static_rgb_key)
+            if background:
+                background_cache.discard(plan.background)
+
+    def _stored_keys(self, digest: str, size: Tuple[int, int]) -> List[Hashable]:
+        """raw_store keys every current theme can derive from an upload"""
+        path = self.path(digest)
+        keys = []
+        for name, theme_config in THEMES.items():
+            keys.append(background_cache.stored_key(path, theme_config['layout'].get('mode', 'RGB'), size))
+            keys.extend(layer_keys(upload_theme(name, digest), self.theme_config(theme_config, digest), size))
+        return keys
+
+    def _prune_disk(self):
+        """Delete least recently used uploads and their raw pixel files until they fit 90% of the budget
+
+        Scans every stored upload, so it only runs from add(), which callers keep off the event loop.
+        Raw files rendered since the last add are counted at the next one
+        """
+        try:
+            files = [(entry.stat().st_atime_ns, entry.name[:-len('.png')], entry.stat().st_size)
+                     for entry in os.scandir(self.directory)
+                     if entry.name.endswith('.png') and len(entry.name) == DIGEST_LENGTH + len('.png')]
+        except OSError:
+            return
+
+        size = (config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+        stored = raw_store.sizes()
+        uploads = []
+        for used, digest, file_size in files:
+            keys = self._stored_keys(digest, size)
+            uploads.append((used, digest, keys, file_size + sum(stored.get(raw_store.name(key), 0) for key in keys)))
+        total = sum(cost for _, _, _, cost in uploads)
+        if total <= self.disk_max_bytes:
+            return
+
+        target = int(self.disk_max_bytes * 0.9)
+        for _, digest, keys, cost in sorted(uploads)[:-1]:
+            if total <= target:
+                break
+            try:
+                os.remove(self.path(digest))
+            except OSError:
+                continue
+            for key in keys:
+                raw_store.discard(key)
+            with self._lock:
+                plans = self._plans.pop(digest, {})
+                self.memory_size -= sum(_plan_bytes(plan) for plan in plans.values())
+            self._forget(list(plans.values()))
+            total -= cost
+
+
+background_uploads = BackgroundUploads()